@@ -5,6 +5,8 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_socketio import SocketIO
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -26,6 +28,8 @@ app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///attendance.db"
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    # Web requests and background workers each hold a connection
+    "pool_size": 10,
 }
 
 # Initialize extensions
@@ -35,6 +39,15 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL so readers don't block on the scheduler and worker writes"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.close()
+
 @login_manager.user_loader
 def load_user(user_id):
     from models import AdminUser
@@ -46,9 +59,24 @@ with app.app_context():
     import routes
     import websocket_events
     
+    # Register before the first connection is opened by create_all
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)
+    
     # Create all tables
     db.create_all()
     
+    # create_all skips existing tables, so add indexes introduced later explicitly
+    existing_indexes = {ix['name'] for ix in db.inspect(db.engine).get_indexes('attendance_logs')}
+    for index in models.AttendanceLog.__table__.indexes:
+        if index.name in existing_indexes:
+            continue
+        try:
+            index.create(db.engine)
+        except IntegrityError:
+            # Duplicate punches from older syncs; removing them is left to an explicit migration
+            logging.warning(f"Index {index.name} not created: duplicate attendance logs exist. "
+                            f"Run dedup_attendance_logs.py to remove them.")
+    
     # Create default admin user if it doesn't exist
     from models import AdminUser
     from werkzeug.security import generate_password_hash
@@ -1,76 +1,146 @@
+import asyncio
 import threading
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from app import app, db
 from models import Device
 from device_manager import DeviceManager
 from cache_manager import device_cache, get_device_info_cached, invalidate_device_cache
+from performance_monitor import count_queries
 
 class BackgroundTaskManager:
-    """Manages background tasks for device updates and cache refresh"""
+    """Manages background tasks for device updates and cache refresh
+    
+    All workers are coroutines sharing one event loop on a single daemon
+    thread; blocking device calls are handed to a bounded thread pool.
+    """
     
     def __init__(self):
         self.device_manager = DeviceManager()
         self.running = False
-        self.threads = []
-        
+        self.thread = None
+        self.loop = None
+        self.executor = None
+        self._stop_event = None
+        self.max_probe_workers = 32
+        self.max_refresh_concurrency = 4
+    
     def start(self):
         """Start background tasks"""
         if self.running:
             return
-            
+        
         self.running = True
         logging.info("Starting background tasks...")
         
-        # Start device status update thread
-        status_thread = threading.Thread(target=self._device_status_worker, daemon=True)
-        status_thread.start()
-        self.threads.append(status_thread)
-        
-        # Start cache cleanup thread
-        cleanup_thread = threading.Thread(target=self._cache_cleanup_worker, daemon=True)
-        cleanup_thread.start()
-        self.threads.append(cleanup_thread)
-        
-        # Start device info refresh thread
-        refresh_thread = threading.Thread(target=self._device_info_refresh_worker, daemon=True)
-        refresh_thread.start()
-        self.threads.append(refresh_thread)
-        
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+    
     def stop(self):
         """Stop background tasks"""
         self.running = False
         logging.info("Stopping background tasks...")
         
-    def _device_status_worker(self):
+        # Wake sleeping workers so they exit now rather than after their interval
+        if self.loop and self._stop_event:
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+    
+    def _run_loop(self):
+        """Thread target running the event loop until all workers exit"""
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logging.error(f"Background task loop stopped with error: {e}")
+    
+    async def _main(self):
+        """Run all workers concurrently on this loop"""
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_probe_workers)
+        
+        try:
+            await asyncio.gather(
+                self._device_status_worker(),
+                self._cache_cleanup_worker(),
+                self._device_info_refresh_worker()
+            )
+        finally:
+            self.executor.shutdown(wait=False)
+            self.loop = None
+    
+    async def _sleep(self, seconds):
+        """Sleep between passes, returning early when stop() is called"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _run_blocking(self, func, *args):
+        """Run a blocking call on the worker thread pool"""
+        return await self.loop.run_in_executor(self.executor, func, *args)
+    
+    async def _device_status_worker(self):
         """Background worker to update device online status"""
         while self.running:
             try:
                 with app.app_context():
-                    devices = Device.query.all()
-                    for device in devices:
-                        try:
-                            # Quick online check
-                            online = self.device_manager.is_device_online(device.ip_address)
-                            if device.online_status != online:
-                                device.online_status = online
-                                # Invalidate cache when status changes
-                                invalidate_device_cache(device.ip_address)
-                                logging.info(f"Device {device.name} status changed to {'online' if online else 'offline'}")
-                        except Exception as e:
-                            logging.error(f"Error checking device {device.name} status: {e}")
-                            device.online_status = False
-                    
-                    db.session.commit()
-                    
+                    if app.debug:
+                        # One SELECT plus at most two UPDATEs per pass
+                        with count_queries(db.engine, 'Device status worker', expected=3):
+                            await self._update_device_statuses()
+                    else:
+                        await self._update_device_statuses()
+            
             except Exception as e:
                 logging.error(f"Error in device status worker: {e}")
             
             # Sleep for 60 seconds between checks
-            time.sleep(60)
+            await self._sleep(60)
+    
+    async def _update_device_statuses(self):
+        """Probe every device once and persist status changes"""
+        # Only the columns the status check needs, no ORM instances
+        devices = db.session.query(
+            Device.id, Device.ip_address, Device.online_status, Device.name
+        ).all()
+        
+        # Probe all devices concurrently - the checks are network bound
+        results = await asyncio.gather(*(self._probe_device(device) for device in devices))
+        
+        # Collect only the devices whose status actually changed
+        ids_online = []
+        ids_offline = []
+        for device, online in zip(devices, results):
+            if device.online_status != online:
+                (ids_online if online else ids_offline).append(device.id)
+                # Invalidate cache when status changes
+                invalidate_device_cache(device.ip_address)
+                logging.info(f"Device {device.name} status changed to {'online' if online else 'offline'}")
+        
+        # Steady state: nothing changed, so skip the transaction entirely
+        if not ids_online and not ids_offline:
+            return
+        
+        # One UPDATE per direction instead of one per changed device
+        if ids_online:
+            Device.query.filter(Device.id.in_(ids_online)).update(
+                {Device.online_status: True}, synchronize_session=False)
+        if ids_offline:
+            Device.query.filter(Device.id.in_(ids_offline)).update(
+                {Device.online_status: False}, synchronize_session=False)
+        
+        db.session.commit()
     
-    def _cache_cleanup_worker(self):
+    async def _probe_device(self, device):
+        """Check a single device, treating probe errors as offline"""
+        try:
+            return await self._run_blocking(self.device_manager.is_device_online, device.ip_address)
+        except Exception as e:
+            logging.error(f"Error checking device {device.name} status: {e}")
+            return False
+    
+    async def _cache_cleanup_worker(self):
         """Background worker to clean up expired cache entries"""
         while self.running:
             try:
@@ -81,36 +151,46 @@ class BackgroundTaskManager:
                 logging.error(f"Error in cache cleanup worker: {e}")
             
             # Sleep for 5 minutes between cleanups
-            time.sleep(300)
+            await self._sleep(300)
     
-    def _device_info_refresh_worker(self):
+    async def _device_info_refresh_worker(self):
         """Background worker to refresh device info cache for online devices"""
         while self.running:
             try:
                 with app.app_context():
                     # Only refresh info for online devices
-                    online_devices = Device.query.filter_by(online_status=True).all()
-                    
-                    for device in online_devices:
-                        try:
-                            # Refresh device info in cache
-                            get_device_info_cached(
-                                self.device_manager, 
-                                device.ip_address, 
-                                ttl=600  # 10 minutes TTL for background refresh
-                            )
-                            logging.debug(f"Refreshed cache for device {device.name}")
-                        except Exception as e:
-                            logging.error(f"Error refreshing device {device.name} info: {e}")
-                        
-                        # Small delay between devices to avoid overwhelming network
-                        time.sleep(2)
-                        
+                    online_devices = db.session.query(
+                        Device.ip_address, Device.name
+                    ).filter(Device.online_status == True).all()
+                
+                # Refresh a few devices at a time instead of one every 2 seconds
+                semaphore = asyncio.Semaphore(self.max_refresh_concurrency)
+                await asyncio.gather(*(
+                    self._refresh_device_info(device, semaphore) for device in online_devices
+                ))
+            
             except Exception as e:
                 logging.error(f"Error in device info refresh worker: {e}")
             
             # Sleep for 10 minutes between full refreshes
-            time.sleep(600)
+            await self._sleep(600)
+    
+    async def _refresh_device_info(self, device, semaphore):
+        """Refresh one device's cached info, bounded by the shared semaphore"""
+        async with semaphore:
+            if not self.running:
+                return
+            try:
+                # Refresh device info in cache
+                await self._run_blocking(
+                    get_device_info_cached,
+                    self.device_manager,
+                    device.ip_address,
+                    600  # 10 minutes TTL for background refresh
+                )
+                logging.debug(f"Refreshed cache for device {device.name}")
+            except Exception as e:
+                logging.error(f"Error refreshing device {device.name} info: {e}")
 
 # Global background task manager
 background_tasks = BackgroundTaskManager()
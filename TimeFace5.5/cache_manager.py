@@ -1,7 +1,8 @@
 import time
+import heapq
 import threading
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 class CacheManager:
@@ -9,32 +10,46 @@ class CacheManager:
     
     def __init__(self):
         self.cache: Dict[str, Dict[str, Any]] = {}
+        # Min-heap of (expires_at, key); entries go stale when a key is reset or deleted
+        self._expiry_heap: List[Tuple[float, str]] = []
         self.lock = threading.RLock()
         self.default_ttl = 300  # 5 minutes default TTL
         
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired"""
-        with self.lock:
-            if key in self.cache:
-                entry = self.cache[key]
-                if time.time() < entry['expires_at']:
-                    return entry['data']
-                else:
-                    # Remove expired entry
-                    del self.cache[key]
+        # Entries are replaced, never mutated, and a single dict lookup is atomic,
+        # so reads skip the lock; it is only taken to drop an expired entry
+        entry = self.cache.get(key)
+        if entry is None:
             return None
+        if time.time() < entry['expires_at']:
+            return entry['data']
+        
+        with self.lock:
+            # Remove expired entry unless another thread has just reset it
+            if self.cache.get(key) is entry:
+                del self.cache[key]
+        return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache with TTL"""
         if ttl is None:
             ttl = self.default_ttl
             
+        now = time.time()
+        expires_at = now + ttl
         with self.lock:
             self.cache[key] = {
                 'data': value,
-                'expires_at': time.time() + ttl,
-                'created_at': time.time()
+                'expires_at': expires_at,
+                'created_at': now
             }
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            
+            # Rebuild if overwritten keys have left the heap mostly stale
+            if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+                self._expiry_heap = [(entry['expires_at'], k) for k, entry in self.cache.items()]
+                heapq.heapify(self._expiry_heap)
     
     def delete(self, key: str) -> None:
         """Delete key from cache"""
@@ -46,6 +61,7 @@ class CacheManager:
         """Clear all cache entries"""
         with self.lock:
             self.cache.clear()
+            self._expiry_heap.clear()
     
     def cleanup_expired(self) -> int:
         """Remove expired entries and return count of removed items"""
@@ -53,26 +69,44 @@ class CacheManager:
         removed_count = 0
         
         with self.lock:
-            expired_keys = [
-                key for key, entry in self.cache.items()
-                if current_time >= entry['expires_at']
-            ]
-            
-            for key in expired_keys:
-                del self.cache[key]
-                removed_count += 1
+            # Only pop what has expired instead of scanning every entry
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= current_time:
+                expires_at, key = heapq.heappop(heap)
+                entry = self.cache.get(key)
+                # Skip stale heap entries for keys that were reset or removed
+                if entry is not None and entry['expires_at'] == expires_at:
+                    del self.cache[key]
+                    removed_count += 1
                 
         return removed_count
     
+    def _count_expired(self, current_time: float) -> int:
+        """Count live entries that have expired, visiting only due heap nodes
+        
+        A heap node's children never expire before it, so subtrees whose root
+        is still in the future are skipped. Caller holds the lock.
+        """
+        heap = self._expiry_heap
+        count = 0
+        stack = [0] if heap else []
+        while stack:
+            i = stack.pop()
+            expires_at, key = heap[i]
+            if expires_at > current_time:
+                continue
+            entry = self.cache.get(key)
+            if entry is not None and entry['expires_at'] == expires_at:
+                count += 1
+            stack.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(heap))
+        return count
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         with self.lock:
             current_time = time.time()
             total_entries = len(self.cache)
-            expired_entries = sum(
-                1 for entry in self.cache.values()
-                if current_time >= entry['expires_at']
-            )
+            expired_entries = self._count_expired(current_time)
             
             return {
                 'total_entries': total_entries,
@@ -81,8 +115,9 @@ class CacheManager:
                 'cache_keys': list(self.cache.keys())
             }
 
-# Global cache instance
+# Global cache instances
 device_cache = CacheManager()
+settings_cache = CacheManager()
 
 def get_device_info_cached(device_manager, ip_address: str, ttl: int = 300) -> Optional[Dict[str, Any]]:
     """Get device info with caching"""
@@ -107,6 +142,22 @@ def get_device_info_cached(device_manager, ip_address: str, ttl: int = 300) -> O
     
     return None
 
+TERMINATED_USER_IDS_KEY = "terminated_user_ids"
+
+def get_terminated_user_ids_cached(loader, ttl: int = 60) -> frozenset:
+    """Get the set of terminated user ids, calling loader() at most once per TTL"""
+    cached_ids = device_cache.get(TERMINATED_USER_IDS_KEY)
+    if cached_ids is not None:
+        return cached_ids
+    
+    terminated_ids = frozenset(loader())
+    device_cache.set(TERMINATED_USER_IDS_KEY, terminated_ids, ttl)
+    return terminated_ids
+
+def invalidate_terminated_users_cache():
+    """Drop the cached terminated user ids after user statuses change"""
+    device_cache.delete(TERMINATED_USER_IDS_KEY)
+
 def invalidate_device_cache(ip_address: str = None):
     """Invalidate device cache for specific IP or all devices"""
     if ip_address:
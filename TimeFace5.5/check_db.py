@@ -1,23 +1,32 @@
 #!/usr/bin/env python3
 import sqlite3
 import os
+from itertools import groupby
 
 db_path = 'instance/attendance.db'
 if os.path.exists(db_path):
-    conn = sqlite3.connect(db_path)
+    # Read-only diagnostic: open without write access or a transaction
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, isolation_level=None)
     cursor = conn.cursor()
     
-    # Get all table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row[0] for row in cursor.fetchall()]
+    # Every table with its columns in one query, as (table, column) rows
+    cursor.execute("""
+        SELECT m.name, p.name
+        FROM sqlite_master m LEFT JOIN pragma_table_info(m.name) p
+        WHERE m.type = 'table'
+        ORDER BY m.rowid, p.cid
+    """)
+    table_columns = {
+        table: [column for _, column in rows if column is not None]
+        for table, rows in groupby(cursor.fetchall(), key=lambda row: row[0])
+    }
+    tables = list(table_columns)
     print("Tables in database:", tables)
     
     # Check if job_executions table exists
     if 'job_executions' in tables:
         print("job_executions table exists")
-        cursor.execute("PRAGMA table_info(job_executions)")
-        columns = cursor.fetchall()
-        print("Columns:", [col[1] for col in columns])
+        print("Columns:", table_columns['job_executions'])
     else:
         print("job_executions table does NOT exist")
     
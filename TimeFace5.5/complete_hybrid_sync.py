@@ -5,8 +5,12 @@ Successfully combines pyzk (users/fingerprints) + fpmachine (faces/photos)
 """
 
 import logging
+import queue
+import threading
 import time
-from typing import Dict, List, Optional, Any, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -18,17 +22,81 @@ logging.basicConfig(
     ]
 )
 
+try:
+    from zk import ZK
+    from zk.user import User
+    ZK_AVAILABLE = True
+except ImportError:
+    ZK_AVAILABLE = False
+    logging.warning("pyzk library not available. User/fingerprint sync disabled.")
+
+try:
+    from fpmachine.devices import ZMM220_TFT
+    FPMACHINE_AVAILABLE = True
+except ImportError:
+    FPMACHINE_AVAILABLE = False
+    logging.warning("fpmachine library not available. Face/photo sync disabled.")
+
 class CompleteHybridSync:
     """Complete hybrid sync solution using both pyzk and fpmachine"""
     
     def __init__(self):
         self.pyzk_connections = {}
         self.fpmachine_connections = {}
+        # ip -> pyzk user list read while choosing the primary, reused by the sync steps
+        self.device_users = {}
+        # Connections kept by complete_sync(persist=True) are reused for this long
+        self.connection_idle_ttl = 60
+        self._last_used = {}
+        # Upper bound on threads talking to devices at once
+        self.max_workers = 16
+        # (library, ip) -> lock; a pyzk or fpmachine connection is one socket and
+        # must only carry one request at a time, while different devices run in parallel
+        self._device_locks = defaultdict(threading.RLock)
+        self._device_locks_guard = threading.Lock()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect_all()
+    
+    def _device_lock(self, library: str, ip_address: str) -> threading.RLock:
+        """Lock serialising calls on one device connection"""
+        with self._device_locks_guard:
+            return self._device_locks[(library, ip_address)]
+    
+    def _cached_connection(self, connections: Dict[str, Any], ip_address: str) -> Optional[Any]:
+        """A connection kept from an earlier sync, or None if there is none or it sat idle too long"""
+        conn = connections.get(ip_address)
+        if conn is None:
+            return None
+        if time.time() - self._last_used.get(ip_address, 0) < self.connection_idle_ttl:
+            return conn
+        
+        connections.pop(ip_address, None)
+        try:
+            conn.disconnect()
+        except Exception as e:
+            logging.debug(f"Error closing idle connection to {ip_address}: {e}")
+        return None
     
     def connect_pyzk(self, ip_address: str) -> Optional[Any]:
         """Connect using pyzk library for users/fingerprints"""
+        conn = self._cached_connection(self.pyzk_connections, ip_address)
+        if conn is not None:
+            try:
+                conn.read_sizes()  # one small packet as a liveness check
+                return conn
+            except Exception as e:
+                logging.info(f"Kept pyzk connection to {ip_address} is dead, reconnecting: {e}")
+                self.pyzk_connections.pop(ip_address, None)
+        
+        if not ZK_AVAILABLE:
+            logging.error(f"pyzk connection failed for {ip_address}: pyzk not installed")
+            return None
+        
         try:
-            from zk import ZK
             zk = ZK(ip_address, port=4370, timeout=15, ommit_ping=True)
             conn = zk.connect()
             if conn:
@@ -41,8 +109,24 @@ class CompleteHybridSync:
     
     def connect_fpmachine(self, ip_address: str) -> Optional[Any]:
         """Connect using fpmachine library for faces/photos"""
+        dev = self._cached_connection(self.fpmachine_connections, ip_address)
+        if dev is not None:
+            try:
+                dev.device_time  # one get_time round trip as a liveness check
+                return dev
+            except Exception as e:
+                logging.info(f"Kept fpmachine connection to {ip_address} is dead, reconnecting: {e}")
+                self.fpmachine_connections.pop(ip_address, None)
+                try:
+                    dev.disconnect()
+                except Exception:
+                    pass
+        
+        if not FPMACHINE_AVAILABLE:
+            logging.error(f"fpmachine connection failed for {ip_address}: fpmachine not installed")
+            return None
+        
         try:
-            from fpmachine.devices import ZMM220_TFT
             dev = ZMM220_TFT(ip_address, 4370, "latin-1")
             if dev.connect(0):
                 self.fpmachine_connections[ip_address] = dev
@@ -52,41 +136,50 @@ class CompleteHybridSync:
             logging.error(f"fpmachine connection failed for {ip_address}: {e}")
         return None
     
-    def sync_users_and_fingerprints(self, source_ip: str, target_ip: str) -> Dict[str, int]:
-        """Sync users and fingerprints using pyzk (proven working method)"""
+    def get_users_and_fingerprints(self, ip_address: str) -> Tuple[List[Any], Dict[str, List[Any]]]:
+        """Read users and their fingerprint templates (grouped by user_id) via pyzk"""
+        with self._device_lock('pyzk', ip_address):
+            conn = self.pyzk_connections[ip_address]
+            users = self._get_users(ip_address)
+            
+            # Group templates by user in one pass
+            uid_to_user_id = {user.uid: user.user_id for user in users}
+            user_templates = defaultdict(list)
+            for template in conn.get_templates() or []:
+                user_id = uid_to_user_id.get(template.uid)
+                if user_id:
+                    user_templates[user_id].append(template)
+            
+            return users, dict(user_templates)
+    
+    def sync_users_and_fingerprints(self, source_ip: str, target_ip: str,
+                                    source_data: Optional[Tuple[List[Any], Dict[str, List[Any]]]] = None) -> Dict[str, int]:
+        """Sync users and fingerprints using pyzk (proven working method)
+        
+        source_data is get_users_and_fingerprints(source_ip), read once by
+        callers syncing several targets from the same source.
+        """
         
         if source_ip not in self.pyzk_connections or target_ip not in self.pyzk_connections:
             logging.error("Both devices must be connected via pyzk for user/fingerprint sync")
             return {'users_synced': 0, 'templates_synced': 0}
         
-        source_conn = self.pyzk_connections[source_ip]
         target_conn = self.pyzk_connections[target_ip]
         
         logging.info(f"Syncing users and fingerprints from {source_ip} to {target_ip}")
         
         # Get users from both devices
-        source_users = source_conn.get_users() or []
-        target_users = target_conn.get_users() or []
+        if source_data is None:
+            source_data = self.get_users_and_fingerprints(source_ip)
+        source_users, user_templates = source_data
+        target_users = self._get_users(target_ip)
         
         source_user_dict = {user.user_id: user for user in source_users}
         target_user_dict = {user.user_id: user for user in target_users}
         
-        # Get fingerprint templates
-        source_templates = source_conn.get_templates() or []
-        
-        # Group templates by user
-        source_uid_to_user_id = {user.uid: user.user_id for user in source_users}
-        user_templates = {}
-        for template in source_templates:
-            user_id = source_uid_to_user_id.get(template.uid)
-            if user_id:
-                if user_id not in user_templates:
-                    user_templates[user_id] = []
-                user_templates[user_id].append(template)
-        
         # Find users to sync
-        users_to_add = [user for user_id, user in source_user_dict.items() 
-                       if user_id not in target_user_dict]
+        missing_user_ids = source_user_dict.keys() - target_user_dict.keys()
+        users_to_add = [source_user_dict[user_id] for user_id in missing_user_ids]
         
         users_synced = 0
         templates_synced = 0
@@ -95,164 +188,263 @@ class CompleteHybridSync:
         existing_uids = {user.uid for user in target_users}
         max_uid = max(existing_uids) if existing_uids else 0
         
+        # Assign UIDs and pair each user with its fingerprints before writing anything
+        bundles = []
         for user in users_to_add:
+            if user.uid not in existing_uids:
+                new_uid = user.uid
+            else:
+                max_uid += 1
+                new_uid = max_uid
+            
+            target_user = User(new_uid, user.name, user.privilege, user.password,
+                               getattr(user, 'group_id', ''), user.user_id, getattr(user, 'card', 0))
+            bundles.append((target_user, user_templates.get(user.user_id, [])))
+        
+        if not bundles:
+            return {'users_synced': users_synced, 'templates_synced': templates_synced}
+        
+        # pyzk's save_user_template refreshes the device after every user. Hold
+        # the refresh back while writing and refresh once at the end instead.
+        with self._device_lock('pyzk', target_ip):
+            target_conn.disable_device()
+            target_conn.refresh_data = lambda: None
             try:
-                # Assign UID
-                if user.uid not in existing_uids:
-                    new_uid = user.uid
-                else:
-                    max_uid += 1
-                    new_uid = max_uid
-                
-                # Add user
-                target_conn.set_user(
-                    uid=new_uid,
-                    name=user.name,
-                    privilege=user.privilege,
-                    password=user.password,
-                    user_id=user.user_id,
-                    group_id=getattr(user, 'group_id', ''),
-                    card=getattr(user, 'card', 0)
-                )
-                users_synced += 1
-                
-                # Add fingerprint templates
-                if user.user_id in user_templates:
+                for target_user, fingers in bundles:
                     try:
-                        templates = user_templates[user.user_id]
-                        result = target_conn.save_user_template(user=new_uid, fingers=templates)
-                        if result is not False:
-                            templates_synced += len(templates)
+                        target_conn.save_user_template(user=target_user, fingers=fingers)
+                        users_synced += 1
+                        templates_synced += len(fingers)
+                        logging.info(f"Synced user {target_user.user_id} ({target_user.name}) with {len(fingers)} templates")
                     except Exception as e:
-                        logging.warning(f"Failed to sync fingerprints for user {user.user_id}: {e}")
-                
-                logging.info(f"Synced user {user.user_id} ({user.name}) with {len(user_templates.get(user.user_id, []))} templates")
-                
-            except Exception as e:
-                logging.error(f"Error syncing user {user.user_id}: {e}")
-        
+                        logging.error(f"Error syncing user {target_user.user_id}: {e}")
+            finally:
+                try:
+                    # Drop the instance override so the class method runs again
+                    del target_conn.refresh_data
+                    target_conn.refresh_data()
+                finally:
+                    # Never leave the keypad locked, even if the refresh fails
+                    target_conn.enable_device()
+            
         return {'users_synced': users_synced, 'templates_synced': templates_synced}
     
     def get_users_with_face_data(self, ip_address: str) -> Dict[str, Dict[str, Any]]:
         """Get users with face templates and photos using fpmachine"""
+        users_with_face_data = dict(self.iter_users_with_face_data(ip_address))
+        logging.info(f"Found {len(users_with_face_data)} users with face/photo data on {ip_address}")
+        return users_with_face_data
+    
+    def iter_users_with_face_data(self, ip_address: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (user_id, face data) for each user with a face template or photo, as read"""
         
         if ip_address not in self.fpmachine_connections:
             logging.error(f"No fpmachine connection for {ip_address}")
-            return {}
+            return
         
         dev = self.fpmachine_connections[ip_address]
-        users_with_face_data = {}
         
-        try:
-            users = dev.get_users()
-            if not users:
-                return {}
-            
-            logging.info(f"Checking {len(users)} users for face/photo data on {ip_address}")
-            
-            for i, user in enumerate(users):
-                if i % 50 == 0:
-                    logging.info(f"  Progress: {i}/{len(users)} users checked")
+        with self._device_lock('fpmachine', ip_address):
+            try:
+                users = dev.get_users()
+                if not users:
+                    return
                 
-                user_id = getattr(user, 'person_id', getattr(user, 'id', str(i)))
-                user_name = getattr(user, 'name', f'User_{i}')
+                logging.info(f"Checking {len(users)} users for face/photo data on {ip_address}")
                 
-                user_data = {
-                    'user_object': user,
-                    'user_id': user_id,
-                    'user_name': user_name,
-                    'face_template': None,
-                    'photo': None,
-                    'has_face_data': False
-                }
+                # pyzk's face counter is filled in once its user list has been read; when
+                # it reports no faces, skip the per-user face probes entirely. Firmware
+                # that omits the face block leaves faces at 0 with faces_cap 0, so the
+                # counter only counts as reported when a face capacity came with it.
+                probe_faces = True
+                if ip_address in self.device_users:
+                    pyzk_conn = self.pyzk_connections.get(ip_address)
+                    probe_faces = not getattr(pyzk_conn, 'faces_cap', 0) or getattr(pyzk_conn, 'faces', 1) != 0
+                    if not probe_faces:
+                        logging.info(f"Device {ip_address} reports no face templates, checking photos only")
                 
-                # Check for face template
-                try:
-                    face_data = dev.get_user_face(str(user_id))
-                    if face_data and len(face_data) > 0:
-                        user_data['face_template'] = face_data
-                        user_data['has_face_data'] = True
-                except Exception as e:
-                    logging.debug(f"No face template for user {user_id}: {e}")
+                # Every record comes from the same class, so resolve attribute names once
+                first = users[0]
+                id_attr = 'person_id' if hasattr(first, 'person_id') else ('id' if hasattr(first, 'id') else None)
+                has_name = hasattr(first, 'name')
+                has_face_flag = hasattr(first, 'face')
+                # Per-miss debug messages are only formatted when someone will see them
+                log_misses = logging.getLogger().isEnabledFor(logging.DEBUG)
                 
-                # Check for photo
-                try:
-                    photo_data = dev.get_user_pic(str(user_id))
-                    if photo_data and len(photo_data) > 0:
-                        user_data['photo'] = photo_data
-                        user_data['has_face_data'] = True
-                except Exception as e:
-                    logging.debug(f"No photo for user {user_id}: {e}")
+                next_progress = 0
+                for i, user in enumerate(users):
+                    if i == next_progress:
+                        logging.info(f"  Progress: {i}/{len(users)} users checked")
+                        next_progress += 50
+                    
+                    user_id = getattr(user, id_attr) if id_attr else str(i)
+                    user_name = user.name if has_name else f'User_{i}'
+                    device_user_id = str(user_id)
+                    
+                    user_data = {
+                        'user_object': user,
+                        'user_id': user_id,
+                        'user_name': user_name,
+                        'face_template': None,
+                        'photo': None,
+                        'has_face_data': False
+                    }
+                    
+                    # Check for face template, unless the device or the user record
+                    # already says there is none
+                    if probe_faces and (not has_face_flag or user.face):
+                        try:
+                            face_data = dev.get_user_face(device_user_id)
+                            if face_data and len(face_data) > 0:
+                                user_data['face_template'] = face_data
+                                user_data['has_face_data'] = True
+                        except Exception as e:
+                            if log_misses:
+                                logging.debug(f"No face template for user {user_id}: {e}")
+                    
+                    # Check for photo
+                    try:
+                        photo_data = dev.get_user_pic(device_user_id)
+                        if photo_data and len(photo_data) > 0:
+                            user_data['photo'] = photo_data
+                            user_data['has_face_data'] = True
+                    except Exception as e:
+                        if log_misses:
+                            logging.debug(f"No photo for user {user_id}: {e}")
+                    
+                    if user_data['has_face_data']:
+                        yield user_id, user_data
                 
-                if user_data['has_face_data']:
-                    users_with_face_data[user_id] = user_data
-            
-            logging.info(f"Found {len(users_with_face_data)} users with face/photo data on {ip_address}")
-            
-        except Exception as e:
-            logging.error(f"Error getting face data from {ip_address}: {e}")
+            except Exception as e:
+                logging.error(f"Error getting face data from {ip_address}: {e}")
+    
+    @staticmethod
+    def _read_ahead(iterable: Iterable[Any], maxsize: int = 8) -> Iterator[Any]:
+        """Iterate over iterable on a helper thread, keeping at most maxsize items buffered
+        
+        Lets reads from one device overlap with writes to another while
+        bounding how many blobs are held in memory.
+        """
+        buffer = queue.Queue(maxsize=maxsize)
+        stop = threading.Event()
+        done = object()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
         
-        return users_with_face_data
+        def produce():
+            try:
+                for item in iterable:
+                    if not put(item):
+                        return
+            finally:
+                put(done)
+        
+        threading.Thread(target=produce, name='face-read-ahead', daemon=True).start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is done:
+                    return
+                yield item
+        finally:
+            # Unblocks the producer if the consumer stops early
+            stop.set()
+    
     
-    def sync_face_and_photos(self, source_ip: str, target_ip: str) -> Dict[str, int]:
-        """Sync face templates and photos using fpmachine"""
+    def sync_face_and_photos(self, source_ip: str, target_ip: str,
+                             source_face_data: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, int]:
+        """Sync face templates and photos using fpmachine
+        
+        source_face_data is get_users_with_face_data(source_ip), read once by
+        callers syncing several targets from the same source. Without it the
+        source is streamed: read ahead on a helper thread while the target is written.
+        """
         
         if source_ip not in self.fpmachine_connections or target_ip not in self.fpmachine_connections:
             logging.error("Both devices must be connected via fpmachine for face sync")
             return {'face_templates_synced': 0, 'photos_synced': 0, 'errors': 0}
         
-        source_dev = self.fpmachine_connections[source_ip]
         target_dev = self.fpmachine_connections[target_ip]
         
         # Get users with face data from source
-        source_face_data = self.get_users_with_face_data(source_ip)
-        
-        if not source_face_data:
+        if source_face_data is None:
+            logging.info(f"Streaming face data from {source_ip} to {target_ip}")
+            source_records = self._read_ahead(self.iter_users_with_face_data(source_ip), maxsize=8)
+        elif not source_face_data:
             logging.info(f"No face data found on source device {source_ip}")
             return {'face_templates_synced': 0, 'photos_synced': 0, 'errors': 0}
-        
-        logging.info(f"Syncing face data from {source_ip} to {target_ip} for {len(source_face_data)} users")
+        else:
+            logging.info(f"Syncing face data from {source_ip} to {target_ip} for {len(source_face_data)} users")
+            source_records = source_face_data.items()
         
         results = {'face_templates_synced': 0, 'photos_synced': 0, 'errors': 0}
         
-        for user_id, face_data in source_face_data.items():
-            try:
-                # Sync face template
-                if face_data['face_template']:
-                    try:
-                        success = target_dev.set_user_face(str(user_id), face_data['face_template'])
-                        if success:
-                            results['face_templates_synced'] += 1
-                            logging.info(f"✓ Synced face template for user {user_id} ({face_data['user_name']})")
-                        else:
-                            logging.warning(f"✗ Failed to sync face template for user {user_id}")
+        with self._device_lock('fpmachine', target_ip):
+            for user_id, face_data in source_records:
+                try:
+                    # Sync face template
+                    if face_data['face_template']:
+                        try:
+                            success = target_dev.set_user_face(str(user_id), face_data['face_template'])
+                            if success:
+                                results['face_templates_synced'] += 1
+                                logging.info(f"✓ Synced face template for user {user_id} ({face_data['user_name']})")
+                            else:
+                                logging.warning(f"✗ Failed to sync face template for user {user_id}")
+                                results['errors'] += 1
+                        except Exception as e:
+                            logging.error(f"Error syncing face template for user {user_id}: {e}")
                             results['errors'] += 1
-                    except Exception as e:
-                        logging.error(f"Error syncing face template for user {user_id}: {e}")
-                        results['errors'] += 1
-                
-                # Sync photo
-                if face_data['photo']:
-                    try:
-                        success = target_dev.set_user_pic(str(user_id), face_data['photo'])
-                        if success:
-                            results['photos_synced'] += 1
-                            logging.info(f"✓ Synced photo for user {user_id} ({face_data['user_name']})")
-                        else:
-                            logging.warning(f"✗ Failed to sync photo for user {user_id}")
+                    
+                    # Sync photo
+                    if face_data['photo']:
+                        try:
+                            success = target_dev.set_user_pic(str(user_id), face_data['photo'])
+                            if success:
+                                results['photos_synced'] += 1
+                                logging.info(f"✓ Synced photo for user {user_id} ({face_data['user_name']})")
+                            else:
+                                logging.warning(f"✗ Failed to sync photo for user {user_id}")
+                                results['errors'] += 1
+                        except Exception as e:
+                            logging.error(f"Error syncing photo for user {user_id}: {e}")
                             results['errors'] += 1
-                    except Exception as e:
-                        logging.error(f"Error syncing photo for user {user_id}: {e}")
-                        results['errors'] += 1
-                        
-            except Exception as e:
-                logging.error(f"Error syncing data for user {user_id}: {e}")
-                results['errors'] += 1
-        
+                            
+                except Exception as e:
+                    logging.error(f"Error syncing data for user {user_id}: {e}")
+                    results['errors'] += 1
+            
         return results
     
-    def complete_sync(self, device_ips: List[str]) -> Dict[str, Any]:
-        """Perform complete hybrid sync of all data types"""
+    def _get_users(self, ip_address: str) -> List[Any]:
+        """pyzk user list for a device, read at most once per complete_sync"""
+        users = self.device_users.get(ip_address)
+        if users is None:
+            with self._device_lock('pyzk', ip_address):
+                users = self.pyzk_connections[ip_address].get_users() or []
+            self.device_users[ip_address] = users
+        return users
+    
+    def _count_users(self, ip_address: str) -> int:
+        """Number of users on a pyzk-connected device, 0 if it can't be read"""
+        try:
+            return len(self._get_users(ip_address))
+        except:
+            return 0
+    
+    def complete_sync(self, device_ips: List[str], persist: bool = False) -> Dict[str, Any]:
+        """Perform complete hybrid sync of all data types
+        
+        With persist=True the device connections stay open for the next call
+        (close them with disconnect_all() or by using the instance as a context manager).
+        """
         
         logging.info(f"Starting complete hybrid sync with {len(device_ips)} devices")
         start_time = time.time()
@@ -260,15 +452,17 @@ class CompleteHybridSync:
         if len(device_ips) < 2:
             return {'success': False, 'error': 'Need at least 2 devices'}
         
-        # Step 1: Connect to all devices with both libraries
+        # Step 1: Connect to all devices with both libraries; every handshake
+        # is independent network waiting, so they all run at once
         logging.info("Step 1: Connecting to devices...")
-        for ip in device_ips:
-            self.connect_pyzk(ip)
-            self.connect_fpmachine(ip)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(device_ips) * 2)) as pool:
+            for ip in device_ips:
+                pool.submit(self.connect_pyzk, ip)
+                pool.submit(self.connect_fpmachine, ip)
         
-        # Check connections
-        pyzk_connected = list(self.pyzk_connections.keys())
-        fpmachine_connected = list(self.fpmachine_connections.keys())
+        # Check connections, keeping the caller's device order
+        pyzk_connected = [ip for ip in device_ips if ip in self.pyzk_connections]
+        fpmachine_connected = [ip for ip in device_ips if ip in self.fpmachine_connections]
         
         if len(pyzk_connected) < 2:
             return {'success': False, 'error': f'Need at least 2 pyzk connections, got {len(pyzk_connected)}'}
@@ -278,48 +472,51 @@ class CompleteHybridSync:
         
         # Step 2: Determine primary device (most users)
         logging.info("Step 2: Determining primary device...")
-        device_user_counts = {}
-        
-        for ip in pyzk_connected:
-            try:
-                users = self.pyzk_connections[ip].get_users() or []
-                device_user_counts[ip] = len(users)
-            except:
-                device_user_counts[ip] = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pyzk_connected))) as pool:
+            device_user_counts = dict(zip(pyzk_connected, pool.map(self._count_users, pyzk_connected)))
         
         primary_ip = max(device_user_counts.keys(), key=lambda ip: device_user_counts[ip])
         logging.info(f"Primary device: {primary_ip} with {device_user_counts[primary_ip]} users")
         
-        # Step 3: Sync users and fingerprints
-        logging.info("Step 3: Syncing users and fingerprints...")
-        user_sync_results = {}
-        total_users_synced = 0
-        total_templates_synced = 0
-        
-        for target_ip in pyzk_connected:
-            if target_ip != primary_ip:
-                result = self.sync_users_and_fingerprints(primary_ip, target_ip)
-                user_sync_results[target_ip] = result
-                total_users_synced += result['users_synced']
-                total_templates_synced += result['templates_synced']
-        
-        # Step 4: Sync face templates and photos
-        logging.info("Step 4: Syncing face templates and photos...")
-        face_sync_results = {}
-        total_face_synced = 0
-        total_photos_synced = 0
-        total_face_errors = 0
-        
-        for target_ip in fpmachine_connected:
-            if target_ip != primary_ip:
-                result = self.sync_face_and_photos(primary_ip, target_ip)
-                face_sync_results[target_ip] = result
-                total_face_synced += result['face_templates_synced']
-                total_photos_synced += result['photos_synced']
-                total_face_errors += result['errors']
+        # Steps 3 and 4 both read the primary once, then write every target at the
+        # same time. pyzk and fpmachine use separate sockets, so a target's user and
+        # face syncs overlap too; _device_lock keeps each socket to one request at a time.
+        logging.info("Steps 3-4: Syncing users, fingerprints, face templates and photos...")
+        user_targets = [ip for ip in pyzk_connected if ip != primary_ip]
+        face_targets = [ip for ip in fpmachine_connected if ip != primary_ip]
+        
+        # Each stage starts as soon as its own primary read is done: user writes don't
+        # wait for the (much slower) face probe of the primary
+        workers = len(user_targets) + len(face_targets) + 1
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, workers)) as pool:
+            # A single face target streams from the primary instead (see sync_face_and_photos)
+            primary_faces = pool.submit(self.get_users_with_face_data, primary_ip) if len(face_targets) > 1 else None
+            source_data = self.get_users_and_fingerprints(primary_ip)
+            user_futures = {
+                target_ip: pool.submit(self.sync_users_and_fingerprints, primary_ip, target_ip, source_data)
+                for target_ip in user_targets
+            }
+            
+            source_face_data = primary_faces.result() if primary_faces else None
+            face_futures = {
+                target_ip: pool.submit(self.sync_face_and_photos, primary_ip, target_ip, source_face_data)
+                for target_ip in face_targets
+            }
+            user_sync_results = {target_ip: future.result() for target_ip, future in user_futures.items()}
+            face_sync_results = {target_ip: future.result() for target_ip, future in face_futures.items()}
+        
+        total_users_synced = sum(result['users_synced'] for result in user_sync_results.values())
+        total_templates_synced = sum(result['templates_synced'] for result in user_sync_results.values())
+        total_face_synced = sum(result['face_templates_synced'] for result in face_sync_results.values())
+        total_photos_synced = sum(result['photos_synced'] for result in face_sync_results.values())
+        total_face_errors = sum(result['errors'] for result in face_sync_results.values())
         
         # Step 5: Cleanup
-        self.disconnect_all()
+        if persist:
+            self.device_users.clear()
+            self._last_used.update(dict.fromkeys(device_ips, time.time()))
+        else:
+            self.disconnect_all()
         
         total_time = time.time() - start_time
         
@@ -357,6 +554,8 @@ class CompleteHybridSync:
         
         self.pyzk_connections.clear()
         self.fpmachine_connections.clear()
+        self.device_users.clear()
+        self._last_used.clear()
 
 
 def test_complete_hybrid_sync():
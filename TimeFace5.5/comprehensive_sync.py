@@ -302,7 +302,7 @@ class ComprehensiveDeviceSync:
                 # Disconnect all devices
                 for ip, conn in device_connections.items():
                     try:
-                        self.device_manager.disconnect_device(conn)
+                        self.device_manager.release_device(ip, conn)
                     except Exception as e:
                         logging.warning(f"Error disconnecting from {ip}: {e}")
                 
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+One-off migration: remove duplicate attendance punches left by older syncs
+and build the ux_attlog unique index on (device_id, user_id, timestamp).
+
+Keeps the earliest row of each duplicate group. Rows without a device_id are
+left alone, matching the unique index which does not treat NULLs as equal.
+Back up instance/attendance.db before running; the delete is irreversible.
+"""
+
+import logging
+import os
+import sqlite3
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+db_path = 'instance/attendance.db'
+
+def dedup_attendance_logs():
+    if not os.path.exists(db_path):
+        logging.error(f"Database file {db_path} does not exist")
+        return False
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            cursor = conn.execute("""
+                DELETE FROM attendance_logs
+                WHERE device_id IS NOT NULL
+                  AND id NOT IN (
+                      SELECT MIN(id) FROM attendance_logs
+                      WHERE device_id IS NOT NULL
+                      GROUP BY device_id, user_id, timestamp
+                  )
+            """)
+            logging.info(f"Removed {cursor.rowcount} duplicate attendance log rows")
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_attlog "
+                "ON attendance_logs (device_id, user_id, timestamp)"
+            )
+            logging.info("Unique index ux_attlog is in place")
+        return True
+    except Exception as e:
+        logging.error(f"Deduplication failed: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    dedup_attendance_logs()
@@ -1,10 +1,25 @@
+import asyncio
 import logging
+import operator
+import os
+import queue
+import random
 import socket
+import sqlite3
+import struct
+import threading
 import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from cache_manager import device_cache, get_terminated_user_ids_cached
+
 try:
     from zk import ZK
+    from zk.user import User
     ZK_AVAILABLE = True
 except ImportError:
     ZK_AVAILABLE = False
@@ -17,25 +32,338 @@ except ImportError:
     ENHANCED_SYNC_AVAILABLE = False
     logging.warning("Enhanced sync module not available.")
 
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'attendance.db')
+
+
+def _apply_pragmas(db_conn):
+    """Per-connection sqlite tuning for concurrent scheduler and web writers
+    
+    journal_mode=WAL persists in the database file; the rest are per connection.
+    """
+    db_conn.execute('PRAGMA journal_mode=WAL')
+    db_conn.execute('PRAGMA synchronous=NORMAL')
+    db_conn.execute('PRAGMA busy_timeout=30000')
+    db_conn.execute('PRAGMA temp_store=MEMORY')
+    db_conn.execute('PRAGMA cache_size=-65536')
+    return db_conn
+
+
+# Process-wide pool of warm autocommit connections shared by all DeviceManagers
+_sqlite_pool = queue.Queue(maxsize=8)
+
+
+@contextmanager
+def _pooled_db():
+    """Borrow a pooled sqlite connection, opening a new one if the pool is drained"""
+    try:
+        db_conn = _sqlite_pool.get_nowait()
+    except queue.Empty:
+        db_conn = _apply_pragmas(sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False))
+        db_conn.execute('PRAGMA mmap_size=268435456')
+    try:
+        yield db_conn
+    finally:
+        if db_conn.in_transaction:
+            db_conn.rollback()
+        try:
+            _sqlite_pool.put_nowait(db_conn)
+        except queue.Full:
+            db_conn.close()
+
+
+@contextmanager
+def _db_transaction():
+    """Run the enclosed statements in one transaction on a pooled connection"""
+    with _pooled_db() as db_conn:
+        db_conn.execute('BEGIN')
+        try:
+            yield db_conn
+        except Exception:
+            db_conn.rollback()
+            raise
+        else:
+            db_conn.commit()
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+SQLITE_MAX_PARAMS = 500
+
+# Attendance status labels stored in attendance_logs.status
+STATUS_CHECK_IN = 'Check In'
+STATUS_CHECK_OUT = 'Check Out'
+# Indexed by device status code
+_STATUS_TEXTS = (STATUS_CHECK_IN, STATUS_CHECK_OUT, 'Break Out', 'Break In', 'OT In', 'OT Out')
+
+# Inserts a punch unless it is already stored. The existence check does not rely
+# on the ux_attlog unique index, which is skipped on databases holding legacy duplicates.
+_INSERT_NEW_LOG_SQL = """
+    INSERT INTO attendance_logs (device_id, user_id, timestamp, status, area, exported_flag)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6
+    WHERE NOT EXISTS (
+        SELECT 1 FROM attendance_logs WHERE device_id = ?1 AND user_id = ?2 AND timestamp = ?3
+    )
+"""
+
+
+def _load_terminated_user_ids():
+    with _pooled_db() as db_conn:
+        return {str(row[0]) for row in db_conn.execute("SELECT user_id FROM users WHERE status = 'Terminated'")}
+
+
+def get_terminated_user_ids():
+    """Terminated user ids from the database, cached for a minute across devices"""
+    return get_terminated_user_ids_cached(_load_terminated_user_ids)
+
+
+@dataclass(slots=True)
+class DeviceInfo:
+    """Counts and identity read from a device by get_device_info()"""
+    user_count: int = 0
+    template_count: int = 0
+    face_count: int = 0
+    log_count: int | str = 0
+    device_time: str = 'N/A'
+    serial: str = 'N/A'
+    today_logs: int = 0
+    yesterday_logs: int = 0
+
+    # Dict-style access for callers written against the old dict return value
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+@dataclass(slots=True)
+class DeviceUser:
+    """The fields user sync reads from a pyzk user, without its per-instance __dict__"""
+    uid: int
+    user_id: str
+    name: str
+
+
 class DeviceManager:
     def __init__(self):
+        # Idle pooled connections: ip -> deque of (conn, last_used)
         self.connections = {}
+        # Checked-out connections: (thread id, ip) -> [conn, ...]
+        self._in_use = {}
+        self._pool_lock = threading.Lock()
+        self._ip_locks = defaultdict(threading.Lock)
+        self.pool_max_idle = 4
+        self.pool_idle_ttl = 30
+        # Daemon thread closing idle connections; runs only while the pool is non-empty
+        self._janitor = None
+        # (lookup kind, value) -> (fetched_at, (device_id, name, area_name))
+        self._device_meta_cache = {}
+        self.device_meta_ttl = 300
+        # ip -> index of the connection config that last succeeded
+        self._preferred_cfg = {}
         self.connection_timeout = 10
+        # Blocking pyzk calls for multi-device fan-out run on this pool
+        self._pool = ThreadPoolExecutor(max_workers=32)
+        # area_id -> lock held while that area's template sync runs
+        self._area_sync_locks = defaultdict(threading.Lock)
+        # ip -> (fetched_at, [user, ...]) so back-to-back pushes share one get_users()
+        self._device_users_cache = {}
+        self.device_users_ttl = 30
+        # user_id -> ip of the device templates were last copied from
+        self._template_sources = {}
 
     def disconnect_device(self, ip_address):
-        """Disconnect from a device and clean up connection cache"""
-        if ip_address in self.connections:
-            conn, _ = self.connections[ip_address]
+        """Return this thread's connections to a device to the pool"""
+        with self._pool_lock:
+            held = self._in_use.pop((threading.get_ident(), ip_address), [])
+        for conn in held:
+            self.release_device(ip_address, conn)
+        if held:
+            logging.debug(f"Released connection to device {ip_address}")
+
+    def release_device(self, ip_address, conn):
+        """Give a connection back to the pool instead of disconnecting it
+        
+        Safe to call more than once for the same connection.
+        """
+        if conn is None:
+            return
+        with self._pool_lock:
+            self._forget_in_use(ip_address, conn)
+            idle = self.connections.setdefault(ip_address, deque())
+            if any(pooled is conn for pooled, _ in idle):
+                return
+            if len(idle) < self.pool_max_idle:
+                idle.append((conn, datetime.now()))
+                self._ensure_janitor()
+                return
+        self._close_quietly(conn)
+
+    def reap_idle_connections(self):
+        """Close idle pooled connections unused for pool_idle_ttl seconds, returning the count"""
+        cutoff = datetime.now() - timedelta(seconds=self.pool_idle_ttl)
+        expired = []
+        with self._pool_lock:
+            for idle in self.connections.values():
+                # Released connections are appended, so the oldest sit on the left
+                while idle and idle[0][1] < cutoff:
+                    expired.append(idle.popleft()[0])
+        for conn in expired:
+            self._close_quietly(conn)
+        if expired:
+            logging.debug(f"Closed {len(expired)} idle device connections")
+        return len(expired)
+
+    def _ensure_janitor(self):
+        # Caller holds _pool_lock
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=self._janitor_loop, name='device-pool-janitor', daemon=True)
+            self._janitor.start()
+
+    def _janitor_loop(self):
+        """Reap idle connections so devices get their session slots back, then exit once the pool is empty"""
+        while True:
+            time.sleep(self.pool_idle_ttl)
             try:
-                conn.disconnect()
-            except:
-                pass
-            del self.connections[ip_address]
-            logging.debug(f"Disconnected from device {ip_address}")
+                self.reap_idle_connections()
+            except Exception as e:
+                logging.debug(f"Error reaping idle device connections: {e}")
+            with self._pool_lock:
+                if not any(self.connections.values()):
+                    self._janitor = None
+                    return
+
+    def wipe_device(self, ip_address):
+        """Disconnect and drop every idle pooled connection to a device"""
+        with self._pool_lock:
+            idle = self.connections.pop(ip_address, None) or ()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        """Disconnect every idle pooled connection"""
+        with self._pool_lock:
+            ip_addresses = list(self.connections)
+        for ip_address in ip_addresses:
+            self.wipe_device(ip_address)
+
+    def _discard_connection(self, ip_address, conn):
+        """Drop a checked-out connection that may be in a bad state"""
+        if conn is None:
+            return
+        with self._pool_lock:
+            self._forget_in_use(ip_address, conn)
+        self._close_quietly(conn)
+
+    def _detach_connection(self, ip_address, conn):
+        """Hand a checked-out connection over to another thread
+        
+        The new owner is responsible for release_device() or _discard_connection().
+        """
+        with self._pool_lock:
+            self._forget_in_use(ip_address, conn)
+
+    def _forget_in_use(self, ip_address, conn):
+        # Caller holds _pool_lock
+        key = (threading.get_ident(), ip_address)
+        held = self._in_use.get(key)
+        if held:
+            self._in_use[key] = [c for c in held if c is not conn]
+            if not self._in_use[key]:
+                del self._in_use[key]
+
+    def _ip_lock(self, ip_address):
+        """Lock serializing new connection attempts to one device"""
+        with self._pool_lock:
+            return self._ip_locks[ip_address]
+
+    def _mark_in_use(self, ip_address, conn):
+        with self._pool_lock:
+            held = self._in_use.setdefault((threading.get_ident(), ip_address), [])
+            held.append(conn)
+            # A caller that never released is not coming back for these
+            stale = held[:-self.pool_max_idle]
+            del held[:-self.pool_max_idle]
+        for old in stale:
+            self._close_quietly(old)
+
+    @staticmethod
+    def _device_socket(conn):
+        """Underlying socket of a pyzk connection (private attribute in pyzk)"""
+        return getattr(conn, '_ZK__sock', None)
+
+    @staticmethod
+    def _set_keepalive(sock, idle=60, interval=20, count=3):
+        """Let the kernel detect dead TCP links and keep NAT state alive"""
+        if sock is None or sock.type != socket.SOCK_STREAM:
+            return
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+            elif hasattr(socket, 'TCP_KEEPALIVE'):
+                # macOS name for the idle time option
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+            if hasattr(socket, 'TCP_KEEPCNT'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+        except OSError as e:
+            logging.debug(f"Could not enable keepalive: {e}")
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.disconnect()
+        except:
+            pass
+
+    def _take_idle_connection(self, ip_address):
+        """Pop the most recently used live connection for a device, if any"""
+        while True:
+            with self._pool_lock:
+                idle = self.connections.get(ip_address)
+                if not idle:
+                    return None
+                conn, last_used = idle.pop()
+            
+            if (datetime.now() - last_used).total_seconds() >= self.pool_idle_ttl:
+                # Everything older in the deque has expired too
+                self._close_quietly(conn)
+                self.wipe_device(ip_address)
+                return None
+            
+            try:
+                # Keepalive cannot flag a dead link within the idle TTL, so
+                # prove liveness with a round trip before handing it out
+                conn.get_time()
+                logging.debug(f"Reusing existing connection to {ip_address}")
+                return conn
+            except Exception as e:
+                logging.debug(f"Existing connection to {ip_address} is dead: {str(e)}")
+                self._close_quietly(conn)
+
+    @contextmanager
+    def _checkout(self, ip_address, timeout=10):
+        """Check out a pooled connection, returning it to the pool on exit
+        
+        Yields None if the device could not be reached.
+        """
+        conn = self.connect_device(ip_address, timeout)
+        try:
+            yield conn
+        except Exception:
+            self._discard_connection(ip_address, conn)
+            raise
+        else:
+            self.release_device(ip_address, conn)
 
     def connect_device(self, ip_address, timeout=10):
         """Connect to a ZKTeco device with enhanced connection handling
         
+        Reuses a pooled connection when one is live. Hand the connection
+        back with release_device() (or disconnect_device()) when done.
+        
         Args:
             ip_address (str): IP address of the device
             timeout (int): Connection timeout in seconds (default: 10)
@@ -47,39 +375,30 @@ class DeviceManager:
             logging.error("pyzk library not available")
             return None
             
-        # Check if we have a recent connection
-        if ip_address in self.connections:
-            conn, last_used = self.connections[ip_address]
-            if (datetime.now() - last_used).total_seconds() < 30:
-                try:
-                    # Test if connection is still alive
-                    conn.get_time()
-                    self.connections[ip_address] = (conn, datetime.now())
-                    logging.debug(f"Reusing existing connection to {ip_address}")
-                    return conn
-                except Exception as e:
-                    logging.debug(f"Existing connection to {ip_address} is dead: {str(e)}")
-                    try:
-                        conn.disconnect()
-                    except:
-                        pass
-                    del self.connections[ip_address]
-
+        conn = self._take_idle_connection(ip_address)
+        if conn is None:
+            # One opener per device at a time; whoever waited may find a
+            # connection released by the thread that went first
+            with self._ip_lock(ip_address):
+                conn = self._take_idle_connection(ip_address)
+                if conn is None:
+                    conn = self._open_connection(ip_address, timeout)
+        if conn is not None:
+            self._mark_in_use(ip_address, conn)
+        return conn
+
+    def _open_connection(self, ip_address, timeout):
+        """Open a fresh connection, retrying with backoff"""
         max_retries = 3
-        retry_delay = 2
         
         for attempt in range(1, max_retries + 1):
             conn = None
             try:
                 # First, check basic network connectivity
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result = sock.connect_ex((ip_address, 4370))
-                sock.close()
-            
-                if result != 0:
+                if not self._tcp_probe(ip_address, timeout=3):
                     logging.warning(f"TCP connection to {ip_address}:4370 failed (attempt {attempt}/{max_retries})")
-                    time.sleep(retry_delay * attempt)
+                    if attempt < max_retries:
+                        self._backoff(attempt)
                     continue
                 
                 # Try different connection configurations
@@ -92,51 +411,25 @@ class DeviceManager:
                     {"force_udp": False, "ommit_ping": False, "timeout": timeout, "verbose": False},
                 ]
                 
-                for config_idx, config in enumerate(configurations):
-                    try:
-                        logging.debug(f"Trying configuration {config_idx + 1} for {ip_address}")
-                        
-                        conn = ZK(
-                            ip_address,
-                            port=4370,
-                            password=0,
-                            **config
-                        )
-                        
-                        # Attempt connection
-                        if conn.connect():
-                            # Verify connection with a simple command
-                            try:
-                                conn.get_time()
-                                # If successful, store connection
-                                self.connections[ip_address] = (conn, datetime.now())
-                                logging.info(f"Successfully connected to device {ip_address} using config {config_idx + 1}")
-                                return conn
-                            except Exception as verify_error:
-                                logging.debug(f"Connection verification failed: {verify_error}")
-                                conn.disconnect()
-                                conn = None
-                        else:
-                            if conn:
-                                try:
-                                    conn.disconnect()
-                                except:
-                                    pass
-                                conn = None
-                            
-                    except Exception as config_error:
-                        logging.debug(f"Config {config_idx + 1} failed: {config_error}")
-                        if conn:
-                            try:
-                                conn.disconnect()
-                            except:
-                                pass
-                            conn = None
-                        continue
+                # Steady state: go straight to the config that worked last time
+                preferred_idx = self._preferred_cfg.get(ip_address)
+                if preferred_idx is not None:
+                    conn = self._try_config(ip_address, preferred_idx, configurations[preferred_idx])
+                    if conn:
+                        return conn
+                    self._preferred_cfg.pop(ip_address, None)
+                
+                conn = self._race_configs(ip_address, configurations)
+                if conn:
+                    return conn
                 
                 # If all configurations failed
                 raise Exception("All connection configurations failed")
                 
+            except socket.gaierror as e:
+                # Bad address - retrying will not help
+                logging.error(f"Invalid device address {ip_address}: {e}")
+                return None
             except socket.timeout:
                 logging.error(f"Connection to {ip_address} timed out (attempt {attempt}/{max_retries})")
             except ConnectionRefusedError:
@@ -151,28 +444,128 @@ class DeviceManager:
                 except:
                     pass
             
-            # Exponential backoff before retry
             if attempt < max_retries:
-                sleep_time = retry_delay * (2 ** (attempt - 1))
-                logging.debug(f"Retrying in {sleep_time} seconds...")
-                time.sleep(sleep_time)
+                self._backoff(attempt)
         
         logging.error(f"Failed to connect to device {ip_address} after {max_retries} attempts")
         return None
 
+    def _try_config(self, ip_address, config_idx, config):
+        """Connect and verify with one configuration, returning the conn or None"""
+        conn = None
+        try:
+            logging.debug(f"Trying configuration {config_idx + 1} for {ip_address}")
+            
+            conn = ZK(
+                ip_address,
+                port=4370,
+                password=0,
+                **config
+            )
+            
+            # Attempt connection, then verify with a simple command
+            if conn.connect():
+                conn.get_time()
+                self._set_keepalive(self._device_socket(conn))
+                logging.info(f"Successfully connected to device {ip_address} using config {config_idx + 1}")
+                return conn
+        except Exception as config_error:
+            logging.debug(f"Config {config_idx + 1} failed: {config_error}")
+        
+        if conn:
+            self._close_quietly(conn)
+        return None
+
+    def _race_configs(self, ip_address, configurations):
+        """Try all configurations at once and keep the first that connects
+        
+        A TCP-only device no longer waits out the UDP timeout first.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(configurations))
+        futures = {
+            executor.submit(self._try_config, ip_address, idx, config): idx
+            for idx, config in enumerate(configurations)
+        }
+        winner = None
+        pending = set(futures)
+        try:
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    conn = future.result()
+                    if conn is None:
+                        continue
+                    if winner is None:
+                        winner = conn
+                        self._preferred_cfg[ip_address] = futures[future]
+                    else:
+                        self._close_quietly(conn)
+        finally:
+            # Losers still connecting are closed as soon as they finish
+            for future in pending:
+                if not future.cancel():
+                    future.add_done_callback(self._close_late_connection)
+            executor.shutdown(wait=False)
+        
+        return winner
+
+    def _close_late_connection(self, future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            self._close_quietly(future.result())
+
+    @staticmethod
+    def _tcp_probe(ip_address, port=4370, timeout=2):
+        """Return True if the device accepts a TCP connection
+        
+        The socket is closed with SO_LINGER 0 so it resets instead of
+        lingering in TIME_WAIT and eating ephemeral ports on frequent scans.
+        Unresolvable addresses raise socket.gaierror.
+        """
+        try:
+            sock = socket.create_connection((ip_address, port), timeout)
+        except socket.gaierror:
+            raise
+        except OSError:
+            return False
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        finally:
+            sock.close()
+        return True
+
+    @staticmethod
+    def _backoff(attempt, base_delay=2, max_delay=30, jitter=0.5):
+        """Sleep for a capped, jittered exponential delay before a retry
+        
+        Jitter keeps callers that failed together from retrying in lockstep.
+        """
+        delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+        delay *= 1 + random.uniform(-jitter, jitter)
+        logging.debug(f"Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+
     def is_device_online(self, ip_address, port=4370):
-        """Check if device is online with improved connectivity test"""
+        """Check if device is online - a TCP connect to the ZK port is enough
+        
+        Use is_device_healthy() when an authenticated ZK session is required.
+        """
         if not ZK_AVAILABLE:
             return False
 
         try:
-            # Quick TCP check first
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(2)
-            result = sock.connect_ex((ip_address, port))
-            sock.close()
+            return self._tcp_probe(ip_address, port)
+        except Exception as e:
+            logging.debug(f"Device {ip_address} check failed: {str(e)}")
+            return False
 
-            if result != 0:
+    def is_device_healthy(self, ip_address, port=4370):
+        """Check that the device accepts a full ZK handshake, not just TCP"""
+        if not ZK_AVAILABLE:
+            return False
+
+        try:
+            # Quick TCP check first
+            if not self._tcp_probe(ip_address, port):
                 return False
 
             # Try simplified connection test
@@ -220,84 +613,114 @@ class DeviceManager:
 
     def get_device_info(self, ip_address, port=4370, timeout=10):
         """Fetch device information including employee count, biometric count, etc."""
-        device_info = {
-            'user_count': 0,
-            'template_count': 0,
-            'face_count': 0,
-            'log_count': 0,
-            'device_time': 'N/A',
-            'serial': 'N/A',
-            'today_logs': 0,
-            'yesterday_logs': 0
-        }
-
-        conn = self.connect_device(ip_address, timeout)
-        if not conn:
-            return device_info
+        device_info = DeviceInfo()
 
-        try:
-            # Get device time
-            try:
-                device_info['device_time'] = conn.get_time().strftime('%Y-%m-%d %H:%M:%S')
-            except:
-                device_info['device_time'] = 'N/A'
+        # Pooled checkout: the connection goes back to the pool, not disconnected
+        with self._checkout(ip_address, timeout) as conn:
+            if not conn:
+                return device_info
 
-            # Get serial number
             try:
-                device_info['serial'] = conn.get_serialnumber() or 'N/A'
-            except:
-                pass
+                # Get device time
+                try:
+                    device_info.device_time = conn.get_time().strftime('%Y-%m-%d %H:%M:%S')
+                except:
+                    device_info.device_time = 'N/A'
 
-            # Get user count
-            try:
-                users = conn.get_users()
-                device_info['user_count'] = len(users) if users else 0
-            except Exception as e:
-                logging.warning(f"Error getting users from {ip_address}: {e}")
-                device_info['user_count'] = 0
+                # Get serial number
+                try:
+                    device_info.serial = conn.get_serialnumber() or 'N/A'
+                except:
+                    pass
 
-            # Get biometric counts
-            try:
-                device_info['template_count'] = getattr(conn, 'fingers', 0)
-                device_info['face_count'] = getattr(conn, 'faces', 0)
-            except Exception as e:
-                logging.warning(f"Error getting biometric counts from {ip_address}: {e}")
+                # Get user, biometric and record counts from one small sizes packet
+                # rather than downloading the whole user table just to count it
+                try:
+                    conn.read_sizes()
+                    device_info.user_count = getattr(conn, 'users', 0)
+                    device_info.template_count = getattr(conn, 'fingers', 0)
+                    device_info.face_count = getattr(conn, 'faces', 0)
+                    device_info.log_count = getattr(conn, 'records', 0)
+                except Exception as e:
+                    logging.warning(f"Error reading sizes from {ip_address}: {e}")
+                    try:
+                        users = conn.get_users()
+                        device_info.user_count = len(users) if users else 0
+                    except Exception as e:
+                        logging.warning(f"Error getting users from {ip_address}: {e}")
+                        device_info.user_count = 0
 
-            # Get attendance logs with date filtering
-            try:
-                today = datetime.now().date()
-                yesterday = today - timedelta(days=1)
-                
-                # Try to get just the count if possible
-                if hasattr(conn, 'get_attendance_size'):
-                    device_info['log_count'] = conn.get_attendance_size()
-                
-                # Get today's and yesterday's logs with limit
-                logs = conn.get_attendance()
-                if logs:
-                    device_info['log_count'] = len(logs)
-                    device_info['today_logs'] = len([log for log in logs if hasattr(log, 'timestamp') and log.timestamp.date() == today])
-                    device_info['yesterday_logs'] = len([log for log in logs if hasattr(log, 'timestamp') and log.timestamp.date() == yesterday])
-                
-            except Exception as e:
-                if "10040" in str(e) or "buffer" in str(e).lower():
-                    device_info['log_count'] = "Many"
-                logging.warning(f"Error getting logs from {ip_address}: {e}")
+                # Get attendance logs with date filtering
+                try:
+                    today = datetime.now().date()
+                    
+                    # Try to get just the count if possible
+                    if hasattr(conn, 'get_attendance_size'):
+                        device_info.log_count = conn.get_attendance_size()
+                    
+                    # Get today's and yesterday's logs with limit
+                    logs = conn.get_attendance()
+                    if logs:
+                        (device_info.log_count, device_info.today_logs,
+                         device_info.yesterday_logs) = self._count_recent_logs(logs, today)
+                    
+                except Exception as e:
+                    if "10040" in str(e) or "buffer" in str(e).lower():
+                        device_info.log_count = "Many"
+                    logging.warning(f"Error getting logs from {ip_address}: {e}")
 
-            return device_info
+                return device_info
 
-        except Exception as e:
-            logging.error(f"Error getting device info from {ip_address}: {str(e)}")
-            return device_info
-            
-        finally:
-            # Clean up connection
-            try:
-                conn.disconnect()
-            except:
-                pass
-            if ip_address in self.connections:
-                del self.connections[ip_address]
+            except Exception as e:
+                logging.error(f"Error getting device info from {ip_address}: {str(e)}")
+                return device_info
+
+    async def _get_device_info_async(self, ip_address):
+        """Run get_device_info on the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self.get_device_info, ip_address)
+
+    async def _is_device_online_async(self, ip_address):
+        """Run is_device_online on the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self.is_device_online, ip_address)
+
+    async def _gather_device_info(self, device_ips):
+        """Fetch info from all devices at once, returning exceptions in place"""
+        return await asyncio.gather(
+            *(self._get_device_info_async(ip) for ip in device_ips), return_exceptions=True)
+
+    async def _gather_online_status(self, device_ips):
+        """Probe all devices at once, returning exceptions in place"""
+        return await asyncio.gather(
+            *(self._is_device_online_async(ip) for ip in device_ips), return_exceptions=True)
+
+    def get_device_info_many(self, device_ips):
+        """Fetch info from several devices concurrently
+        
+        Returns:
+            dict: IP address -> device info dict, or the exception raised for that device
+        """
+        device_ips = list(device_ips)
+        if not device_ips:
+            return {}
+        results = asyncio.run(self._gather_device_info(device_ips))
+        return dict(zip(device_ips, results))
+
+    def check_devices_online(self, device_ips):
+        """Check several devices concurrently, treating probe errors as offline
+        
+        Returns:
+            dict: IP address -> bool
+        """
+        device_ips = list(device_ips)
+        if not device_ips:
+            return {}
+        results = asyncio.run(self._gather_online_status(device_ips))
+        return {
+            ip: result is True
+            for ip, result in zip(device_ips, results)
+        }
 
     def sync_users_between_devices(self, source_ip, target_ip):
         """Sync users from source device to target device"""
@@ -316,20 +739,34 @@ class DeviceManager:
             # Create set of existing user IDs on target
             target_user_ids = {user.user_id for user in target_users} if target_users else set()
             
+            # Bundle each missing user with its fingerprints so both go in one upload
+            missing_users = [user for user in source_users if user.user_id not in target_user_ids]
+            fingers_by_uid = {}
+            if missing_users:
+                for template in source_conn.get_templates() or []:
+                    fingers_by_uid.setdefault(template.uid, []).append(template)
+            
+            # All source reads are done; free its session before writing to the target
+            self.release_device(source_ip, source_conn)
+            
             synced_count = 0
-            for user in source_users:
-                if user.user_id not in target_user_ids:
-                    try:
-                        # Add user to target device
-                        target_conn.set_user(uid=user.uid, name=user.name, privilege=user.privilege, 
-                                           password=user.password, group_id=user.group_id, user_id=user.user_id)
-                        synced_count += 1
-                        logging.info(f"Synced user {user.user_id} from {source_ip} to {target_ip}")
-                    except Exception as e:
-                        logging.warning(f"Failed to sync user {user.user_id}: {e}")
+            if missing_users:
+                # Keep the device from serving punches while it is being written to
+                target_conn.disable_device()
+                try:
+                    for user in missing_users:
+                        try:
+                            target_conn.save_user_template(user, fingers_by_uid.get(user.uid, []))
+                            synced_count += 1
+                            logging.info(f"Synced user {user.user_id} from {source_ip} to {target_ip}")
+                        except Exception as e:
+                            logging.warning(f"Failed to sync user {user.user_id}: {e}")
+                finally:
+                    target_conn.enable_device()
+                    target_conn.refresh_data()
+                self._invalidate_device_users(target_ip)
             
-            source_conn.disconnect()
-            target_conn.disconnect()
+            self.release_device(target_ip, target_conn)
             
             logging.info(f"Synced {synced_count} users from {source_ip} to {target_ip}")
             return synced_count
@@ -371,34 +808,16 @@ class DeviceManager:
                             'templates': {}
                         }
                         
-                        # Get templates for each user (fingerprint and face)
+                        # One bulk read per record type, then map onto users by uid
+                        fingers_by_uid, faces_by_uid = self._templates_by_uid(conn)
                         for user in users:
-                            try:
-                                # Get fingerprint templates
-                                finger_templates = conn.get_user_template(uid=user.uid)
-                                if finger_templates:
-                                    device_data[ip_address]['templates'][user.user_id] = {
-                                        'fingerprint': finger_templates,
-                                        'face': None
-                                    }
-                                
-                                # Try to get face templates if supported
-                                try:
-                                    if hasattr(conn, 'get_face_template'):
-                                        face_template = conn.get_face_template(uid=user.uid)
-                                        if face_template:
-                                            if user.user_id not in device_data[ip_address]['templates']:
-                                                device_data[ip_address]['templates'][user.user_id] = {
-                                                    'fingerprint': None,
-                                                    'face': face_template
-                                                }
-                                            else:
-                                                device_data[ip_address]['templates'][user.user_id]['face'] = face_template
-                                except Exception as face_e:
-                                    logging.debug(f"No face template for user {user.user_id} on {ip_address}: {face_e}")
-                                    
-                            except Exception as e:
-                                logging.debug(f"No templates for user {user.user_id} on {ip_address}: {e}")
+                            finger_templates = fingers_by_uid.get(user.uid)
+                            face_template = faces_by_uid.get(user.uid)
+                            if finger_templates or face_template:
+                                device_data[ip_address]['templates'][user.user_id] = {
+                                    'fingerprint': finger_templates,
+                                    'face': face_template
+                                }
                         
                         logging.info(f"Device {ip_address}: {len(users)} users, {len(device_data[ip_address]['templates'])} templates")
                         
@@ -591,6 +1010,7 @@ class DeviceManager:
             
             # Disconnect all devices
             for ip, conn in device_connections.items():
+                self._invalidate_device_users(ip)
                 try:
                     self.disconnect_device(conn)
                 except Exception as e:
@@ -620,69 +1040,25 @@ class DeviceManager:
                 logging.error(f"Failed to connect to devices for template sync: {source_ip} -> {target_ip}")
                 return False
             
-            synced_count = 0
+            bundles, faces = self._template_diff(source_conn, target_conn)
             
-            # Sync fingerprint templates
-            try:
-                source_templates = source_conn.get_templates()
-                target_templates = target_conn.get_templates()
-                
-                # Create set of existing template UIDs on target
-                target_template_uids = {(tmpl.uid, tmpl.fid) for tmpl in target_templates} if target_templates else set()
-                
-                for template in source_templates:
-                    if (template.uid, template.fid) not in target_template_uids:
-                        try:
-                            # Template sync is complex and requires proper user context
-                            # For now, skip template sync and focus on user sync
-                            logging.debug(f"Skipping template sync for UID:{template.uid} FID:{template.fid} (requires user context)")
-                            continue
-                        except Exception as e:
-                            logging.warning(f"Failed to sync fingerprint template UID:{template.uid} FID:{template.fid}: {e}")
-            except Exception as e:
-                logging.warning(f"Error syncing fingerprint templates: {e}")
+            # All source reads are done; free its session before writing to the target
+            self.release_device(source_ip, source_conn)
             
-            # Sync face templates (if supported)
-            try:
-                if hasattr(source_conn, 'get_face_templates') and hasattr(target_conn, 'save_face_template'):
-                    source_faces = source_conn.get_face_templates()
-                    target_faces = target_conn.get_face_templates() if hasattr(target_conn, 'get_face_templates') else []
-                    
-                    # Create set of existing face template UIDs on target
-                    target_face_uids = {face.uid for face in target_faces} if target_faces else set()
-                    
-                    for face in source_faces:
-                        if face.uid not in target_face_uids:
-                            try:
-                                # Add face template to target device (image data is stored in device)
-                                target_conn.save_face_template(face)
-                                synced_count += 1
-                                logging.info(f"Synced face template UID:{face.uid} from {source_ip} to {target_ip}")
-                            except Exception as e:
-                                logging.warning(f"Failed to sync face template UID:{face.uid}: {e}")
-                else:
-                    logging.info("Face template sync not supported on one or both devices")
-            except Exception as e:
-                logging.warning(f"Error syncing face templates: {e}")
+            if not bundles and not faces:
+                self.release_device(target_ip, target_conn)
+                logging.info(f"Device {target_ip} already has all templates from {source_ip}")
+                return 0
             
-            # Sync user photos/images (if supported)
+            # Writes below go to a disabled device and are committed with one refresh
+            target_conn.disable_device()
             try:
-                if hasattr(source_conn, 'get_user_template') and hasattr(target_conn, 'set_user_template'):
-                    source_users = source_conn.get_users()
-                    for user in source_users[:10]:  # Limit to prevent timeout
-                        try:
-                            # Get user template data including any image data
-                            user_template = source_conn.get_user_template(user.uid)
-                            if user_template:
-                                target_conn.set_user_template(user.uid, user_template)
-                                logging.info(f"Synced user template data for UID:{user.uid}")
-                        except Exception as e:
-                            logging.warning(f"Failed to sync user template for UID:{user.uid}: {e}")
-            except Exception as e:
-                logging.warning(f"Error syncing user template data: {e}")
+                synced_count = self._write_templates(target_conn, bundles, faces, source_ip, target_ip)
+            finally:
+                target_conn.enable_device()
+                target_conn.refresh_data()
             
-            source_conn.disconnect()
-            target_conn.disconnect()
+            self.release_device(target_ip, target_conn)
             
             logging.info(f"Synced {synced_count} templates total from {source_ip} to {target_ip}")
             return synced_count
@@ -691,60 +1067,224 @@ class DeviceManager:
             logging.error(f"Error syncing templates between devices: {e}")
             return False
 
-    def balance_devices_in_area(self, area_name=None):
-        """Balance user and template distribution between devices in the same area"""
+    def _build_dedup_sets(self, conn):
+        """Read what a device already holds, with one RPC per record type
+        
+        Returns:
+            tuple: (user_id -> user dict, set of (uid, fid) fingerprints, set of face uids)
+        """
+        users_by_user_id = {str(user.user_id): user for user in conn.get_users() or []}
+        template_keys = {(tmpl.uid, tmpl.fid) for tmpl in conn.get_templates() or []}
+        face_uids = set()
+        if hasattr(conn, 'get_face_templates'):
+            face_uids = {face.uid for face in conn.get_face_templates() or []}
+        return users_by_user_id, template_keys, face_uids
+
+    def _cached_device_users(self, ip_address, conn):
+        """Device user list, reused for device_users_ttl seconds between calls
+        
+        Writers in this class keep the snapshot current via
+        _remember_device_user() / _invalidate_device_users().
+        """
+        with self._pool_lock:
+            cached = self._device_users_cache.get(ip_address)
+        if cached and time.time() - cached[0] < self.device_users_ttl:
+            return cached[1]
+        
+        users = list(conn.get_users() or [])
+        with self._pool_lock:
+            self._device_users_cache[ip_address] = (time.time(), users)
+        return users
+
+    def _remember_device_user(self, ip_address, uid, user_id, name=''):
+        """Add a user just written to a device to its cached snapshot
+        
+        Stored as a pyzk User like the rest of the snapshot, since cached
+        entries are handed back to pyzk write calls such as save_user_template.
+        """
+        with self._pool_lock:
+            cached = self._device_users_cache.get(ip_address)
+            if cached:
+                cached[1].append(User(uid, name, 0, '', '', str(user_id)))
+
+    def _invalidate_device_users(self, ip_address):
+        with self._pool_lock:
+            self._device_users_cache.pop(ip_address, None)
+
+    @staticmethod
+    def _record_ids(records):
+        """String ids of template/face records, preferring user_id over uid
+        
+        The attribute is probed once on the first record since every record
+        in a bulk read comes from the same class.
+        """
+        if not records:
+            return []
+        attr = 'user_id' if hasattr(records[0], 'user_id') else 'uid'
+        return [str(record_id) for record_id in map(operator.attrgetter(attr), records) if record_id]
+
+    @staticmethod
+    def _user_index(device_users):
+        """Index device users by uid and by user_id for constant-time lookups
+        
+        Returns:
+            tuple: (uid -> user dict, str(user_id) -> user dict)
+        """
+        by_uid = {}
+        by_user_id = {}
+        for device_user in device_users or []:
+            by_uid[device_user.uid] = device_user
+            by_user_id[str(device_user.user_id)] = device_user
+        return by_uid, by_user_id
+
+    def _templates_by_uid(self, conn):
+        """Read every fingerprint (and face, if supported) in one RPC each, grouped by uid
+        
+        Returns:
+            tuple: (uid -> [fingers] dict, uid -> face dict)
+        """
+        fingers_by_uid = {}
+        for template in conn.get_templates() or []:
+            fingers_by_uid.setdefault(template.uid, []).append(template)
+        
+        faces_by_uid = {}
+        if hasattr(conn, 'get_faces'):
+            try:
+                faces_by_uid = {face.uid: face for face in conn.get_faces() or []}
+            except Exception as e:
+                logging.debug(f"Could not read face templates: {e}")
+        return fingers_by_uid, faces_by_uid
+
+    def _template_diff(self, source_conn, target_conn):
+        """Work out which fingerprints and faces the target is missing
+        
+        UIDs are per-device slots, so users are matched across devices by
+        user_id and bundles carry the target's UID. Users the target does
+        not have are skipped.
+        
+        Returns:
+            tuple: ([(user, fingers), ...] per-user fingerprint bundles, [face, ...])
+        """
+        target_users, target_template_keys, target_face_uids = self._build_dedup_sets(target_conn)
+        
+        bundles = []
+        users_by_uid = {}
         try:
-            import sqlite3
-            conn = sqlite3.connect('instance/attendance.db')
-            cursor = conn.cursor()
+            users_by_uid = {user.uid: user for user in source_conn.get_users() or []}
             
-            # Get devices in the same area
-            if area_name:
-                cursor.execute("SELECT ip_address FROM devices WHERE area = ? AND online_status = 1", (area_name,))
-            else:
-                # Get all online devices if no area specified
-                cursor.execute("SELECT ip_address FROM devices WHERE online_status = 1")
+            # Group fingers per user; each user's set is uploaded in one call
+            fingers_by_uid = {}
+            for template in source_conn.get_templates() or []:
+                fingers_by_uid.setdefault(template.uid, []).append(template)
             
-            device_ips = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            for uid, fingers in fingers_by_uid.items():
+                user = users_by_uid.get(uid)
+                if user is None:
+                    logging.debug(f"Skipping templates for UID:{uid} (user not on source device)")
+                    continue
+                target_user = target_users.get(str(user.user_id))
+                if target_user is None:
+                    logging.debug(f"Skipping templates for user {user.user_id} (user not on target device)")
+                    continue
+                missing = [tmpl for tmpl in fingers if (target_user.uid, tmpl.fid) not in target_template_keys]
+                if not missing:
+                    continue
+                # Write into the target's slot for this user so no duplicate user_id is created
+                bundles.append((User(target_user.uid, user.name, user.privilege, user.password,
+                                     user.group_id, user.user_id, user.card), missing))
+        except Exception as e:
+            logging.warning(f"Error reading fingerprint templates: {e}")
+        
+        faces = []
+        try:
+            if hasattr(source_conn, 'get_face_templates') and hasattr(target_conn, 'save_face_template'):
+                for face in source_conn.get_face_templates() or []:
+                    user = users_by_uid.get(face.uid)
+                    target_user = target_users.get(str(user.user_id)) if user else None
+                    # Face records carry the source UID, so only same-slot users can be copied as is
+                    if target_user is None or target_user.uid != face.uid:
+                        continue
+                    if face.uid not in target_face_uids:
+                        faces.append(face)
+            else:
+                logging.info("Face template sync not supported on one or both devices")
+        except Exception as e:
+            logging.warning(f"Error reading face templates: {e}")
+        
+        return bundles, faces
+
+    def _write_templates(self, target_conn, bundles, faces, source_ip, target_ip):
+        """Upload fingerprint bundles and faces to the target, returning the count"""
+        synced_count = 0
+        
+        for user, fingers in bundles:
+            try:
+                target_conn.save_user_template(user, fingers)
+                synced_count += len(fingers)
+            except Exception as e:
+                logging.warning(f"Failed to sync fingerprint templates for UID:{user.uid}: {e}")
+        
+        for face in faces:
+            try:
+                # Add face template to target device (image data is stored in device)
+                target_conn.save_face_template(face)
+                synced_count += 1
+                logging.info(f"Synced face template UID:{face.uid} from {source_ip} to {target_ip}")
+            except Exception as e:
+                logging.warning(f"Failed to sync face template UID:{face.uid}: {e}")
+        
+        return synced_count
+
+    def balance_devices_in_area(self, area_name=None):
+        """Balance user and template distribution between devices in the same area"""
+        try:
+            with _pooled_db() as db_conn:
+                # Get devices in the same area
+                if area_name:
+                    cursor = db_conn.execute("SELECT ip_address FROM devices WHERE area = ? AND online_status = 1", (area_name,))
+                else:
+                    # Get all online devices if no area specified
+                    cursor = db_conn.execute("SELECT ip_address FROM devices WHERE online_status = 1")
+                
+                device_ips = [row[0] for row in cursor.fetchall()]
             
             if len(device_ips) < 2:
                 logging.info("Need at least 2 devices for balancing")
                 return False
             
-            # Get device info for all devices
+            # Get device info for all devices concurrently, as (ip, DeviceInfo) pairs
             device_stats = []
-            for ip in device_ips:
-                info = self.get_device_info(ip)
+            for ip, info in self.get_device_info_many(device_ips).items():
+                if isinstance(info, Exception):
+                    logging.warning(f"Error getting device info from {ip}: {info}")
+                    continue
                 if info:
-                    device_stats.append({
-                        'ip': ip,
-                        'user_count': info.get('user_count', 0),
-                        'template_count': info.get('template_count', 0)
-                    })
+                    device_stats.append((ip, info))
             
             if len(device_stats) < 2:
                 logging.error("Could not get info from enough devices for balancing")
                 return False
             
             # Sort devices by user count (descending)
-            device_stats.sort(key=lambda x: x['user_count'], reverse=True)
+            device_stats.sort(key=lambda stat: stat[1].user_count, reverse=True)
             
-            source_device = device_stats[0]  # Device with most users
-            target_device = device_stats[-1]  # Device with least users
+            source_ip, source_info = device_stats[0]  # Device with most users
+            target_ip, target_info = device_stats[-1]  # Device with least users
             
-            user_diff = source_device['user_count'] - target_device['user_count']
-            template_diff = source_device['template_count'] - target_device['template_count']
+            user_diff = source_info.user_count - target_info.user_count
+            template_diff = source_info.template_count - target_info.template_count
             
-            logging.info(f"Balancing devices: {source_device['ip']} ({source_device['user_count']} users) -> {target_device['ip']} ({target_device['user_count']} users)")
+            logging.info(f"Balancing devices: {source_ip} ({source_info.user_count} users) -> {target_ip} ({target_info.user_count} users)")
             
             # Only balance if difference is significant (>100 users)
             if user_diff > 100:
                 # Sync users from source to target
-                synced_users = self.sync_users_between_devices(source_device['ip'], target_device['ip'])
+                synced_users = self.sync_users_between_devices(source_ip, target_ip)
                 
-                # Sync templates from source to target
-                synced_templates = self.sync_templates_between_devices(source_device['ip'], target_device['ip'])
+                # Sync templates from source to target, unless the target already has as many
+                synced_templates = 0
+                if template_diff > 0:
+                    synced_templates = self.sync_templates_between_devices(source_ip, target_ip)
                 
                 logging.info(f"Balancing complete: {synced_users} users, {synced_templates} templates synced")
                 return {'synced_users': synced_users, 'synced_templates': synced_templates}
@@ -756,6 +1296,29 @@ class DeviceManager:
             logging.error(f"Error balancing devices: {e}")
             return False
 
+    def _get_device_meta(self, cursor, ip_address=None, db_id=None):
+        """Return (device_id, name, area_name) for a device by IP or database id
+        
+        Rows are cached for device_meta_ttl seconds since devices and areas
+        rarely change between log collection runs.
+        """
+        key = ('ip', ip_address) if ip_address is not None else ('id', db_id)
+        cached = self._device_meta_cache.get(key)
+        if cached and time.time() - cached[0] < self.device_meta_ttl:
+            return cached[1]
+        
+        column = 'd.ip_address' if ip_address is not None else 'd.id'
+        cursor.execute(f'SELECT device_id, d.name, a.name FROM devices d LEFT JOIN areas a ON d.area_id = a.id WHERE {column} = ?', (key[1],))
+        row = cursor.fetchone()
+        # Misses aren't cached so newly added devices are picked up right away
+        if row:
+            self._device_meta_cache[key] = (time.time(), row)
+        return row
+
+    def invalidate_device_meta(self):
+        """Drop cached device/area names after devices or areas are edited"""
+        self._device_meta_cache.clear()
+
     def collect_logs_from_device(self, ip_address):
         """Collect attendance logs from a specific device and store in database"""
         try:
@@ -766,57 +1329,42 @@ class DeviceManager:
             # Get attendance logs from device
             logs = conn.get_attendance()
             if not logs:
-                conn.disconnect()
+                self.release_device(ip_address, conn)
                 return 0
             
-            # Store logs in database
-            import sqlite3
-            db_conn = sqlite3.connect('instance/attendance.db')
-            cursor = db_conn.cursor()
-            
             # Get device information (device_id, area)
-            cursor.execute('SELECT device_id, d.name, a.name FROM devices d LEFT JOIN areas a ON d.area_id = a.id WHERE d.ip_address = ?', (ip_address,))
-            device_row = cursor.fetchone()
+            with _pooled_db() as db_conn:
+                device_row = self._get_device_meta(db_conn.cursor(), ip_address=ip_address)
             if not device_row:
                 logging.warning(f"Device {ip_address} not found in database")
-                db_conn.close()
-                conn.disconnect()
+                self.release_device(ip_address, conn)
                 return 0
             
             device_id, device_name, area_name = device_row
             area_name = area_name or 'Unknown'
-            logs_inserted = 0
             
+            rows = []
+            fallback_timestamp = datetime.now().isoformat()
             for log in logs:
-                try:
-                    # Check if log already exists
-                    cursor.execute("""
-                        SELECT id FROM attendance_logs 
-                        WHERE device_id = ? AND user_id = ? AND timestamp = ?
-                    """, (device_id, log.user_id, log.timestamp.isoformat() if hasattr(log, 'timestamp') else None))
-                    
-                    if not cursor.fetchone():
-                        # Insert new log with correct device_id and area information
-                        cursor.execute("""
-                            INSERT INTO attendance_logs (device_id, user_id, timestamp, status, area, exported_flag)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (
-                            device_id,
-                            log.user_id,
-                            log.timestamp.isoformat() if hasattr(log, 'timestamp') else datetime.now().isoformat(),
-                            'Check In' if getattr(log, 'punch', 0) == 0 else 'Check Out',
-                            area_name,
-                            0  # Not exported yet
-                        ))
-                        logs_inserted += 1
-                        
-                except Exception as e:
-                    logging.warning(f"Failed to insert log for user {getattr(log, 'user_id', 'unknown')}: {e}")
+                user_id = getattr(log, 'user_id', None)
+                if user_id is None:
                     continue
-            
-            db_conn.commit()
-            db_conn.close()
-            conn.disconnect()
+                timestamp = getattr(log, 'timestamp', None)
+                rows.append((
+                    device_id,
+                    str(user_id),
+                    timestamp.isoformat() if timestamp is not None else fallback_timestamp,
+                    STATUS_CHECK_IN if getattr(log, 'punch', 0) == 0 else STATUS_CHECK_OUT,
+                    area_name,
+                    0  # Not exported yet
+                ))
+            
+            # Punches that are already stored are skipped
+            with _db_transaction() as db_conn:
+                cursor = db_conn.executemany(_INSERT_NEW_LOG_SQL, rows)
+                logs_inserted = max(cursor.rowcount, 0)
+            
+            self.release_device(ip_address, conn)
             
             logging.info(f"Collected {logs_inserted} new logs from device {ip_address}")
             return logs_inserted
@@ -828,15 +1376,15 @@ class DeviceManager:
     def set_device_time(self, ip_address, datetime_obj=None):
         """Set device time"""
         try:
-            conn = self.connect_device(ip_address)
-            if not conn:
-                return False
+            with self._checkout(ip_address) as conn:
+                if not conn:
+                    return False
 
-            if datetime_obj is None:
-                datetime_obj = datetime.now()
+                if datetime_obj is None:
+                    datetime_obj = datetime.now()
 
-            conn.set_time(datetime_obj)
-            return True
+                conn.set_time(datetime_obj)
+                return True
         except Exception as e:
             logging.error(f"Error setting time for device {ip_address}: {str(e)}")
             return False
@@ -844,12 +1392,12 @@ class DeviceManager:
     def beep_device(self, ip_address):
         """Make device beep"""
         try:
-            conn = self.connect_device(ip_address)
-            if not conn:
-                return False
+            with self._checkout(ip_address) as conn:
+                if not conn:
+                    return False
 
-            conn.test_voice()
-            return True
+                conn.test_voice()
+                return True
         except Exception as e:
             logging.error(f"Error beeping device {ip_address}: {str(e)}")
             return False
@@ -863,17 +1411,12 @@ class DeviceManager:
 
             attendances = conn.get_attendance()
             if not attendances:
-                conn.disconnect()
+                self.release_device(ip_address, conn)
                 return 0
 
-            # Use direct SQLite connection for scheduler compatibility
-            import sqlite3
-            db_conn = sqlite3.connect('instance/attendance.db')
-            cursor = db_conn.cursor()
-            
             # Get device information (device_id should be the actual device_id, not database id)
-            cursor.execute('SELECT device_id, d.name, a.name FROM devices d LEFT JOIN areas a ON d.area_id = a.id WHERE d.id = ?', (device_id,))
-            device_info = cursor.fetchone()
+            with _pooled_db() as db_conn:
+                device_info = self._get_device_meta(db_conn.cursor(), db_id=device_id)
             if device_info:
                 actual_device_id, device_name, area_name = device_info
                 area_name = area_name or 'Unknown'
@@ -881,53 +1424,35 @@ class DeviceManager:
                 actual_device_id = device_id
                 area_name = 'Unknown'
 
-            new_logs_count = 0
-
+            rows = []
             for att in attendances:
-                try:
-                    # Get user_id using correct attribute
-                    user_id = getattr(att, 'user_id', None) or getattr(att, 'uid', None)
-                    if not user_id:
-                        continue
-
-                    user_id_str = str(user_id)
-                    timestamp = getattr(att, 'timestamp', None)
-                    status = getattr(att, 'status', None) or getattr(att, 'punch', None)
-
-                    if not timestamp:
-                        continue
-
-                    # Check if log already exists
-                    cursor.execute("""
-                        SELECT id FROM attendance_logs 
-                        WHERE device_id = ? AND user_id = ? AND timestamp = ?
-                    """, (actual_device_id, user_id_str, timestamp.isoformat()))
-
-                    if not cursor.fetchone():
-                        # Insert new log with correct device_id and area information
-                        cursor.execute("""
-                            INSERT INTO attendance_logs (device_id, user_id, timestamp, status, area, exported_flag)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (
-                            actual_device_id,
-                            user_id_str,
-                            timestamp.isoformat(),
-                            'Check In' if status == 0 else 'Check Out',
-                            area_name,
-                            0  # Not exported yet
-                        ))
-                        new_logs_count += 1
-
-                except Exception as e:
-                    logging.warning(f"Failed to insert log for user {getattr(att, 'user_id', 'unknown')}: {e}")
+                # Get user_id using correct attribute
+                user_id = getattr(att, 'user_id', None) or getattr(att, 'uid', None)
+                timestamp = getattr(att, 'timestamp', None)
+                if not user_id or not timestamp:
                     continue
 
+                status = getattr(att, 'status', None) or getattr(att, 'punch', None)
+                rows.append((
+                    actual_device_id,
+                    str(user_id),
+                    timestamp.isoformat(),
+                    STATUS_CHECK_IN if status == 0 else STATUS_CHECK_OUT,
+                    area_name,
+                    0  # Not exported yet
+                ))
+
+            # Punches that are already stored are skipped
+            new_logs_count = 0
+            if rows:
+                with _db_transaction() as db_conn:
+                    cursor = db_conn.executemany(_INSERT_NEW_LOG_SQL, rows)
+                    new_logs_count = max(cursor.rowcount, 0)
+
             if new_logs_count > 0:
-                db_conn.commit()
                 logging.info(f"Synced {new_logs_count} new logs from device {ip_address}")
 
-            db_conn.close()
-            conn.disconnect()
+            self.release_device(ip_address, conn)
             return new_logs_count
             
         except Exception as e:
@@ -936,109 +1461,84 @@ class DeviceManager:
 
     def sync_users_from_device(self, ip_address, device_id, area_id=None):
         """Sync users from device to database with auto-fetch logs - using user_id not uid"""
+        conn = None
         try:
             conn = self.connect_device(ip_address)
             if not conn:
                 logging.error(f"Could not connect to device {ip_address}")
                 return 0
 
-            device_users = conn.get_users() or []
+            # Project straight into slim records; pyzk User objects are dropped right away
+            device_users = [
+                DeviceUser(user.uid, user.user_id, user.name)
+                for user in conn.get_users() or []
+            ]
             templates = conn.get_templates() or []
 
             if not device_users:
                 logging.warning(f"No users found on device {ip_address}")
                 return 0
 
-            # Create lookup dictionaries for templates using both user_id and uid
-            template_dict = {}
-            face_dict = {}
-            
-            # Get fingerprint templates - check by both user_id and uid
-            for t in templates:
-                # Try user_id first, then fall back to uid
-                user_id = getattr(t, 'user_id', None) or getattr(t, 'uid', None)
-                if user_id:
-                    template_dict[str(user_id)] = True
+            # Sets of user ids holding templates, matched by both user_id and uid
+            template_set = set(self._record_ids(templates))
 
-            # Check for fingerprint templates by iterating through users and checking templates
-            for user in device_users:
+            # Face templates come from one bulk call where the device supports it
+            faces = []
+            if hasattr(conn, 'get_faces'):
                 try:
-                    uid = getattr(user, 'uid', None)
-                    user_id = getattr(user, 'user_id', None)
-                    
-                    if uid:
-                        # Check if user has fingerprint template
-                        try:
-                            finger_templates = conn.get_user_template(uid=uid)
-                            if finger_templates:
-                                if user_id:
-                                    template_dict[str(user_id)] = True
-                                template_dict[str(uid)] = True
-                        except:
-                            pass
-                        
-                        # Check if user has face template
-                        try:
-                            face_template = conn.get_face_template(uid=uid)
-                            if face_template:
-                                if user_id:
-                                    face_dict[str(user_id)] = True
-                                face_dict[str(uid)] = True
-                        except:
-                            pass
-                except:
-                    continue
+                    faces = conn.get_faces() or []
+                except Exception as e:
+                    logging.debug(f"Could not read face templates from {ip_address}: {e}")
+            face_set = set(self._record_ids(faces))
 
-            # Additional face template detection
-            try:
-                faces = conn.get_faces() if hasattr(conn, 'get_faces') else []
-                for f in faces:
-                    user_id = getattr(f, 'user_id', None) or getattr(f, 'uid', None)
-                    if user_id:
-                        face_dict[str(user_id)] = True
-            except:
-                pass
+            # Templates are keyed by device uid; map them onto each user's user_id
+            # in memory instead of one get_user_template RPC per user
+            fp_uids = {getattr(t, 'uid', None) for t in templates}
+            face_uids = {getattr(f, 'uid', None) for f in faces}
+            for user in device_users:
+                uid = getattr(user, 'uid', None)
+                user_id = getattr(user, 'user_id', None)
+                if not uid or not user_id:
+                    continue
+                if uid in fp_uids:
+                    template_set.add(str(user_id))
+                if uid in face_uids:
+                    face_set.add(str(user_id))
 
             # Use direct SQLite connection for scheduler compatibility
-            import sqlite3
-            db_conn = sqlite3.connect('instance/attendance.db')
-            cursor = db_conn.cursor()
+            with _pooled_db() as db_conn:
+                cursor = db_conn.cursor()
             
-            # Get device info
-            cursor.execute('SELECT d.name, a.name FROM devices d LEFT JOIN areas a ON d.area_id = a.id WHERE d.id = ?', (device_id,))
-            device_info = cursor.fetchone()
-            device_name = device_info[0] if device_info else 'Unknown'
-
-            synced_count = 0
-            updated_count = 0
+                # Get device info (cached across scheduler runs)
+                device_info = self._get_device_meta(cursor, db_id=device_id)
+                device_name = device_info[1] if device_info else 'Unknown'
 
-            for device_user in device_users:
-                try:
+                # Normalise device users once: (user_id, first_name, last_name, has_fp, has_face)
+                device_rows = []
+                for device_user in device_users:
                     # Use user_id attribute instead of uid
                     user_id = getattr(device_user, 'user_id', None)
                     if not user_id:
                         continue
 
                     user_id_str = str(user_id)
-                    
-                    # Check if user exists
-                    cursor.execute('SELECT id, area_id, device_id, site, has_fingerprint, has_face FROM users WHERE user_id = ?', (user_id_str,))
-                    existing_user = cursor.fetchone()
-
                     user_name = getattr(device_user, 'name', f'User{user_id_str}') or f'User{user_id_str}'
                     name_parts = user_name.split()
                     first_name = name_parts[0] if name_parts else f'User{user_id_str}'
                     last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else ''
 
-                    has_fingerprint = 1 if user_id_str in template_dict else 0
-                    has_face = 1 if user_id_str in face_dict else 0
+                    has_fingerprint = 1 if user_id_str in template_set else 0
+                    has_face = 1 if user_id_str in face_set else 0
+                    device_rows.append((user_id_str, first_name, last_name, has_fingerprint, has_face))
+
+                existing_users = self._load_existing_users(cursor, [row[0] for row in device_rows])
 
-                    if not existing_user:
-                        # Create new user
-                        cursor.execute("""
-                            INSERT INTO users (user_id, first_name, last_name, status, area_id, device_id, site, has_fingerprint, has_face)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (
+                to_insert = []
+                to_update = []
+                for user_id_str, first_name, last_name, has_fingerprint, has_face in device_rows:
+                    existing_user = existing_users.get(user_id_str)
+                    if existing_user is None:
+                        to_insert.append((
                             user_id_str,
                             first_name,
                             last_name,
@@ -1049,48 +1549,41 @@ class DeviceManager:
                             has_fingerprint,
                             has_face
                         ))
-                        synced_count += 1
-                    else:
-                        # Update existing user with device info
-                        updated = False
-                        updates = []
-                        values = []
-                        
-                        if not existing_user[1] and area_id:  # area_id
-                            updates.append('area_id = ?')
-                            values.append(area_id)
-                            updated = True
-                        if not existing_user[2]:  # device_id
-                            updates.append('device_id = ?')
-                            values.append(device_id)
-                            updated = True
-                        if not existing_user[3]:  # site
-                            updates.append('site = ?')
-                            values.append(device_name)
-                            updated = True
-                        if existing_user[4] != has_fingerprint:  # has_fingerprint
-                            updates.append('has_fingerprint = ?')
-                            values.append(has_fingerprint)
-                            updated = True
-                        if existing_user[5] != has_face:  # has_face
-                            updates.append('has_face = ?')
-                            values.append(has_face)
-                            updated = True
-
-                        if updated:
-                            values.append(user_id_str)
-                            cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE user_id = ?", values)
-                            updated_count += 1
-
-                except Exception as e:
-                    logging.error(f"Error processing user {getattr(device_user, 'user_id', 'unknown')}: {e}")
-                    continue
+                        # Guard against the same user_id appearing twice on the device
+                        existing_users[user_id_str] = (area_id, device_id, device_name, has_fingerprint, has_face)
+                        continue
 
-            if synced_count > 0 or updated_count > 0:
-                db_conn.commit()
-                logging.info(f"Synced {synced_count} new users and updated {updated_count} users from device {ip_address}")
+                    # Fill in missing device info and refresh biometric flags
+                    existing_area, existing_device, existing_site, existing_fp, existing_face = existing_user
+                    if ((not existing_area and area_id) or not existing_device or not existing_site
+                            or existing_fp != has_fingerprint or existing_face != has_face):
+                        to_update.append((area_id, device_id, device_name, has_fingerprint, has_face, user_id_str))
 
-            db_conn.close()
+                # All writes in one transaction
+                db_conn.execute('BEGIN')
+                try:
+                    cursor.executemany("""
+                        INSERT INTO users (user_id, first_name, last_name, status, area_id, device_id, site, has_fingerprint, has_face)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, to_insert)
+                    cursor.executemany("""
+                        UPDATE users SET
+                            area_id = COALESCE(NULLIF(area_id, 0), ?),
+                            device_id = COALESCE(NULLIF(device_id, ''), ?),
+                            site = COALESCE(NULLIF(site, ''), ?),
+                            has_fingerprint = ?,
+                            has_face = ?
+                        WHERE user_id = ?
+                    """, to_update)
+                    db_conn.commit()
+                except Exception:
+                    db_conn.rollback()
+                    raise
+
+                synced_count = len(to_insert)
+                updated_count = len(to_update)
+                if synced_count > 0 or updated_count > 0:
+                    logging.info(f"Synced {synced_count} new users and updated {updated_count} users from device {ip_address}")
             
             # Note: Log collection is handled by separate auto_log_collection_job
             # No need to auto-fetch logs here to avoid duplication
@@ -1099,24 +1592,41 @@ class DeviceManager:
         except Exception as e:
             logging.error(f"Error syncing users from device {ip_address}: {str(e)}")
             return 0
+        finally:
+            self.release_device(ip_address, conn)
+
+    def _load_existing_users(self, cursor, user_ids):
+        """Map user_id -> (area_id, device_id, site, has_fingerprint, has_face) for known users
+        
+        Small batches use chunked IN lookups; once a device would need several
+        chunks, one streaming scan of users filtered in Python is cheaper.
+        """
+        existing_users = {}
+        columns = 'user_id, area_id, device_id, site, has_fingerprint, has_face'
+        
+        if len(user_ids) > SQLITE_MAX_PARAMS:
+            wanted = set(user_ids)
+            for row in cursor.execute(f'SELECT {columns} FROM users'):
+                if row[0] in wanted:
+                    existing_users[row[0]] = row[1:]
+            return existing_users
+        
+        if user_ids:
+            placeholders = ','.join('?' * len(user_ids))
+            cursor.execute(f'SELECT {columns} FROM users WHERE user_id IN ({placeholders})', user_ids)
+            for row in cursor.fetchall():
+                existing_users[row[0]] = row[1:]
+        return existing_users
 
     def get_next_available_uid(self, ip_address):
         """Get next available UID for device"""
         try:
-            conn = self.connect_device(ip_address)
-            if not conn:
-                return 1
+            with self._checkout(ip_address) as conn:
+                if not conn:
+                    return 1
 
-            device_users = conn.get_users() or []
-            if not device_users:
-                return 1
-            
-            # Get max UID from device users
-            max_uid = 0
-            for user in device_users:
-                uid = getattr(user, 'uid', 0)
-                if uid > max_uid:
-                    max_uid = uid
+                # Only the max uid is needed, so don't keep the user list around
+                max_uid = max((getattr(user, 'uid', 0) for user in conn.get_users() or []), default=0)
             
             return max_uid + 1
         except Exception as e:
@@ -1125,47 +1635,57 @@ class DeviceManager:
 
     def sync_users_to_device(self, ip_address, area_id=None):
         """Sync users to device with proper UID assignment"""
+        conn = None
         try:
             conn = self.connect_device(ip_address)
             if not conn:
                 return False
 
-            if area_id:
-                users = User.query.filter_by(area_id=area_id, status='Active').all()
-            else:
-                users = User.query.filter_by(status='Active').all()
-
             # Get existing device users to check for conflicts
-            device_users = conn.get_users() or []
+            device_users = self._cached_device_users(ip_address, conn)
             existing_user_ids = {getattr(u, 'user_id', '') for u in device_users}
             
             # Get next available UID
             next_uid = self.get_next_available_uid(ip_address)
 
-            for user in users:
+            # Only the three columns set_user needs, as plain tuples; read them all
+            # up front so the pooled connection is not held across device writes
+            with _pooled_db() as db_conn:
+                if area_id:
+                    users = db_conn.execute(
+                        "SELECT user_id, first_name, last_name FROM users WHERE area_id = ? AND status = 'Active'",
+                        (area_id,)).fetchall()
+                else:
+                    users = db_conn.execute(
+                        "SELECT user_id, first_name, last_name FROM users WHERE status = 'Active'").fetchall()
+
+            for user_id, first_name, last_name in users:
                 try:
                     # Skip if user already exists on device
-                    if user.user_id in existing_user_ids:
+                    if user_id in existing_user_ids:
                         continue
                         
                     conn.set_user(
                         uid=next_uid,
-                        name=f"{user.first_name} {user.last_name}".strip(),
+                        name=f"{first_name} {last_name}".strip(),
                         privilege=0,
                         password='',
                         group_id='',
-                        user_id=user.user_id
+                        user_id=user_id
                     )
+                    self._remember_device_user(ip_address, next_uid, user_id)
                     next_uid += 1
-                    logging.info(f"Added user {user.user_id} to device {ip_address}")
+                    logging.info(f"Added user {user_id} to device {ip_address}")
                 except Exception as e:
-                    logging.error(f"Error syncing user {user.user_id} to device: {str(e)}")
+                    logging.error(f"Error syncing user {user_id} to device: {str(e)}")
                     continue
 
             return True
         except Exception as e:
             logging.error(f"Error syncing users to device {ip_address}: {str(e)}")
             return False
+        finally:
+            self.release_device(ip_address, conn)
 
     def sync_time_to_device(self, ip_address):
         """Sync current time to device"""
@@ -1176,197 +1696,203 @@ class DeviceManager:
     def sync_templates_between_area_devices(self, area_id):
         """Smart sync templates between area devices with queue management and crash prevention"""
         try:
-            # Check if sync is already in progress for this area
-            sync_key = f"area_sync_{area_id}"
-            if hasattr(self, '_sync_queue') and sync_key in self._sync_queue:
+            # Skip if sync is already in progress for this area (checked and claimed atomically)
+            with self._pool_lock:
+                area_lock = self._area_sync_locks[area_id]
+            if not area_lock.acquire(blocking=False):
                 logging.info(f"Sync already in progress for area {area_id}, skipping")
                 return 0
             
-            # Initialize sync queue if not exists
-            if not hasattr(self, '_sync_queue'):
-                self._sync_queue = set()
-            
-            # Add to sync queue
-            self._sync_queue.add(sync_key)
-            
             try:
-                devices = Device.query.filter_by(area_id=area_id, online_status=True).all()
-                if len(devices) < 2:
+                with _pooled_db() as db_conn:
+                    device_ips = [row[0] for row in db_conn.execute(
+                        "SELECT ip_address FROM devices WHERE area_id = ? AND online_status = 1", (area_id,))]
+                if len(device_ips) < 2:
                     return 0
 
                 # Limit to maximum 5 devices to prevent crashes
-                if len(devices) > 5:
-                    logging.warning(f"Area {area_id} has {len(devices)} devices, limiting to 5 to prevent crashes")
-                    devices = devices[:5]
+                if len(device_ips) > 5:
+                    logging.warning(f"Area {area_id} has {len(device_ips)} devices, limiting to 5 to prevent crashes")
+                    device_ips = device_ips[:5]
 
-                # Find device with most users and templates (master device)
-                device_stats = []
-                for device in devices:
-                    try:
-                        # Use shorter timeout to prevent hanging
-                        conn = self.connect_device(device.ip_address, timeout=5)
-                        if conn:
-                            users = conn.get_users()
-                            user_count = len(users) if users else 0
-                            
-                            # Skip template counting if too many users (prevents buffer overflow)
-                            template_count = 0
-                            if user_count < 500:  # Only count templates for smaller devices
-                                try:
-                                    all_templates = conn.get_templates()
-                                    template_count = len(all_templates) if all_templates else 0
-                                except Exception as e:
-                                    logging.warning(f"Could not count templates for device {device.ip_address}: {e}")
-                                    template_count = 0
-                            
-                            device_stats.append({
-                                'device': device,
-                                'user_count': user_count,
-                                'template_count': template_count,
-                                'total_score': user_count + template_count
-                            })
-                            self.disconnect_device(device.ip_address)
-                    except Exception as e:
-                        logging.error(f"Error getting stats for device {device.ip_address}: {e}")
-                        continue
+                # Find device with most users and templates (master device);
+                # each device is queried on its own worker
+                with ThreadPoolExecutor(max_workers=min(8, len(device_ips))) as pool:
+                    device_stats = [stat for stat in pool.map(self._area_device_stats, device_ips) if stat]
 
                 if not device_stats:
                     return 0
 
-                # Sort by total score to find master device
-                device_stats.sort(key=lambda x: x['total_score'], reverse=True)
-                master_device = device_stats[0]['device']
-                
-                logging.info(f"Using device {master_device.ip_address} as master for area {area_id} (Users: {device_stats[0]['user_count']}, Templates: {device_stats[0]['template_count']})")
-
-                # Get all users from master device with timeout protection
-                master_conn = self.connect_device(master_device.ip_address, timeout=10)
-                if not master_conn:
-                    return 0
-
                 try:
-                    master_users = master_conn.get_users()
-                    if not master_users:
-                        self.disconnect_device(master_device.ip_address)
-                        return 0
-                        
-                    # Limit users to prevent crashes
-                    if len(master_users) > 200:
-                        logging.warning(f"Master device has {len(master_users)} users, limiting to 200 to prevent crashes")
-                        master_users = master_users[:200]
-                        
-                except Exception as e:
-                    logging.error(f"Error getting users from master device: {e}")
-                    self.disconnect_device(master_device.ip_address)
-                    return 0
-
-                synced_count = 0
-                batch_size = 10  # Smaller batches to prevent timeout
-                max_sync_time = 300  # 5 minutes maximum sync time
-                import time
-                start_time = time.time()
-
-                # Sync to all other devices in area
-                for target_stat in device_stats[1:]:
-                    # Check if we've exceeded maximum sync time
-                    if time.time() - start_time > max_sync_time:
-                        logging.warning(f"Sync timeout reached, stopping sync for area {area_id}")
-                        break
-                        
-                    target_device = target_stat['device']
-                    logging.info(f"Syncing from master to device {target_device.ip_address}")
+                    # Sort by total score to find master device
+                    device_stats.sort(key=lambda x: x['total_score'], reverse=True)
+                    master_ip = device_stats[0]['ip']
+                    # Reuse the connection opened for the stats pass for the whole job
+                    master_conn = device_stats[0]['conn']
                     
-                    try:
-                        target_conn = self.connect_device(target_device.ip_address, timeout=10)
-                        if not target_conn:
-                            continue
+                    logging.info(f"Using device {master_ip} as master for area {area_id} (Users: {device_stats[0]['user_count']}, Templates: {device_stats[0]['template_count']})")
 
-                        target_users = target_conn.get_users()
-                        target_user_ids = {u.user_id for u in target_users} if target_users else set()
-
-                        # Process users in small batches with timeout checks
-                        for i in range(0, len(master_users), batch_size):
-                            # Check timeout again
-                            if time.time() - start_time > max_sync_time:
-                                break
-                                
-                            batch_users = master_users[i:i + batch_size]
+                    try:
+                        master_users = device_stats[0]['users']
+                        if not master_users:
+                            return 0
+                        
+                        # All master fingerprints grouped by uid, read at most once per job
+                        master_templates = device_stats[0]['templates']
+                        if master_templates is None:
+                            master_fingers_by_uid, _ = self._templates_by_uid(master_conn)
+                        else:
+                            master_fingers_by_uid = {}
+                            for template in master_templates:
+                                master_fingers_by_uid.setdefault(template.uid, []).append(template)
                             
-                            for master_user in batch_users:
-                                try:
-                                    # Only sync templates for users that exist on both devices
-                                    if master_user.user_id in target_user_ids:
-                                        try:
-                                            master_templates = master_conn.get_user_template(uid=master_user.uid)
-                                            if master_templates:
-                                                # Find corresponding user on target device
-                                                target_user = next((u for u in target_users if u.user_id == master_user.user_id), None)
-                                                if target_user:
-                                                    # Check if target user already has templates
-                                                    try:
-                                                        existing_templates = target_conn.get_user_template(uid=target_user.uid)
-                                                        if not existing_templates:  # Only sync if no templates exist
-                                                            target_conn.save_user_template(user=target_user, fingers=master_templates)
-                                                            synced_count += 1
-                                                            logging.info(f"Synced templates for user {master_user.user_id}")
-                                                    except:
-                                                        # If can't check existing templates, try to sync anyway
-                                                        target_conn.save_user_template(user=target_user, fingers=master_templates)
-                                                        synced_count += 1
-                                        except Exception as e:
-                                            logging.error(f"Error syncing template for user {master_user.user_id}: {e}")
-                                            continue
-
-                                except Exception as e:
-                                    logging.error(f"Error processing user {master_user.user_id}: {e}")
-                                    continue
+                        # Limit users to prevent crashes
+                        if len(master_users) > 200:
+                            logging.warning(f"Master device has {len(master_users)} users, limiting to 200 to prevent crashes")
+                            master_users = master_users[:200]
                             
-                            # Longer delay between batches to prevent device overload
-                            time.sleep(0.5)
-
-                        self.disconnect_device(target_device.ip_address)
                     except Exception as e:
-                        logging.error(f"Error syncing to device {target_device.ip_address}: {e}")
-                        continue
+                        logging.error(f"Error getting users from master device: {e}")
+                        return 0
 
-                self.disconnect_device(master_device.ip_address)
-                logging.info(f"Smart synced {synced_count} templates from master device to {len(device_stats)-1} devices in area {area_id}")
-                return synced_count
+                    batch_size = 10  # Smaller batches to prevent timeout
+                    max_sync_time = 300  # 5 minutes maximum sync time
+                    deadline = time.time() + max_sync_time
+
+                    # Master data is already in memory; target-side writes run in parallel
+                    targets = device_stats[1:]
+                    synced_count = 0
+                    if targets:
+                        with ThreadPoolExecutor(max_workers=min(8, len(targets))) as pool:
+                            synced_count = sum(pool.map(
+                                lambda target: self._sync_area_templates_to_target(
+                                    target, master_users, master_fingers_by_uid, batch_size, deadline),
+                                targets
+                            ))
+
+                    logging.info(f"Smart synced {synced_count} templates from master device to {len(device_stats)-1} devices in area {area_id}")
+                    return synced_count
+                finally:
+                    # Every device was connected once, in the stats pass
+                    for stat in device_stats:
+                        self.release_device(stat['ip'], stat['conn'])
                 
             finally:
-                # Remove from sync queue
-                self._sync_queue.discard(sync_key)
+                area_lock.release()
 
         except Exception as e:
             logging.error(f"Error in smart template sync for area {area_id}: {e}")
             return 0
 
 
+    def _area_device_stats(self, ip_address):
+        """Count users and templates on one area device for master selection"""
+        try:
+            # Use shorter timeout to prevent hanging
+            conn = self.connect_device(ip_address, timeout=5)
+            if not conn:
+                return None
+            try:
+                users = conn.get_users()
+                user_count = len(users) if users else 0
+                
+                # Skip template counting if too many users (prevents buffer overflow)
+                template_count = 0
+                all_templates = None
+                if user_count < 500:  # Only count templates for smaller devices
+                    try:
+                        all_templates = conn.get_templates() or []
+                        template_count = len(all_templates)
+                    except Exception as e:
+                        logging.warning(f"Could not count templates for device {ip_address}: {e}")
+                        template_count = 0
+            except Exception:
+                self._discard_connection(ip_address, conn)
+                raise
+            
+            # The connection is kept for the rest of the job instead of reconnecting later
+            self._detach_connection(ip_address, conn)
+            return {
+                'ip': ip_address,
+                'conn': conn,
+                # Kept so the sync pass does not read them from the device again
+                'users': users or [],
+                'templates': all_templates,
+                'user_count': user_count,
+                'template_count': template_count,
+                'total_score': user_count + template_count
+            }
+        except Exception as e:
+            logging.error(f"Error getting stats for device {ip_address}: {e}")
+            return None
+
+    def _sync_area_templates_to_target(self, target_stat, master_users, master_fingers_by_uid, batch_size, deadline):
+        """Copy master fingerprints to users on one target device that have none, returning the count"""
+        target_ip = target_stat['ip']
+        target_conn = target_stat['conn']
+        logging.info(f"Syncing from master to device {target_ip}")
+        synced_count = 0
+        
+        try:
+            target_users_by_id = {u.user_id: u for u in target_stat['users']}
+            # uids that already hold fingerprints on the target, reusing the stats-pass read
+            target_templates = target_stat['templates']
+            if target_templates is None:
+                target_templates = target_conn.get_templates() or []
+            target_template_uids = {t.uid for t in target_templates}
+
+            # Process users in small batches with timeout checks
+            for i in range(0, len(master_users), batch_size):
+                if time.time() > deadline:
+                    logging.warning(f"Sync timeout reached, stopping sync to device {target_ip}")
+                    break
+                    
+                for master_user in master_users[i:i + batch_size]:
+                    # Only sync templates for users that exist on both devices
+                    target_user = target_users_by_id.get(master_user.user_id)
+                    if not target_user:
+                        continue
+                    try:
+                        master_templates = master_fingers_by_uid.get(master_user.uid)
+                        # Only sync if the target user has no templates yet
+                        if master_templates and target_user.uid not in target_template_uids:
+                            # Back off only when the device actually rejects a write
+                            self._save_templates_with_retry(target_conn, target_user, master_templates)
+                            synced_count += 1
+                            logging.info(f"Synced templates for user {master_user.user_id}")
+                    except Exception as e:
+                        logging.error(f"Error syncing template for user {master_user.user_id}: {e}")
+        except Exception as e:
+            logging.error(f"Error syncing to device {target_ip}: {e}")
+        
+        return synced_count
+
+    def _save_templates_with_retry(self, conn, user, fingers, retries=3):
+        """Upload a user's fingerprints, retrying after 100/200/400 ms (jittered) on failure"""
+        for attempt in range(1, retries + 2):
+            try:
+                return conn.save_user_template(user=user, fingers=fingers)
+            except Exception as e:
+                if attempt > retries:
+                    raise
+                logging.debug(f"Template write for UID:{user.uid} failed ({e}), retrying")
+                self._backoff(attempt, base_delay=0.1, max_delay=1)
+
     def push_users_to_device(self, target_ip, area_id):
         """Push all users from database to a specific device in the area"""
         try:
-            import sqlite3
-            import os
-            
             conn = self.connect_device(target_ip)
             if not conn:
                 logging.error(f"Cannot connect to device {target_ip}")
                 return False
 
-            # Use absolute path for database
-            project_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(project_dir, 'instance', 'attendance.db')
-            
             # Get all active users in the same area using direct SQLite query
-            conn_db = sqlite3.connect(db_path)
-            cursor = conn_db.cursor()
-            cursor.execute("""
-                SELECT user_id, first_name, last_name 
-                FROM users 
-                WHERE area_id = ? AND status = 'Active'
-            """, (area_id,))
-            users = cursor.fetchall()
-            conn_db.close()
+            with _pooled_db() as conn_db:
+                users = conn_db.execute("""
+                    SELECT user_id, first_name, last_name 
+                    FROM users 
+                    WHERE area_id = ? AND status = 'Active'
+                """, (area_id,)).fetchall()
             
             pushed_count = 0
             for user_data in users:
@@ -1390,8 +1916,11 @@ class DeviceManager:
                     logging.error(f"Error pushing user {user_id} to device {target_ip}: {e}")
                     continue
 
+            # set_user may have overwritten existing uids, so re-read next time
+            self._invalidate_device_users(target_ip)
+
             try:
-                conn.disconnect()
+                self.release_device(target_ip, conn)
             except:
                 pass
             logging.info(f"Pushed {pushed_count} users to device {target_ip}")
@@ -1404,53 +1933,52 @@ class DeviceManager:
     def push_single_user_to_device(self, target_ip, user_id):
         """Push a specific user to device with update/create logic"""
         try:
-            conn = self.connect_device(target_ip)
-            if not conn:
-                logging.error(f"Cannot connect to device {target_ip}")
-                return False
-
-            # Get the specific user
-            user = User.query.filter_by(user_id=user_id, status='Active').first()
+            # Get the specific user before opening a device connection
+            with _pooled_db() as db_conn:
+                user = db_conn.execute(
+                    "SELECT user_id, first_name, last_name FROM users WHERE user_id = ? AND status = 'Active'",
+                    (str(user_id),)
+                ).fetchone()
             if not user:
                 logging.error(f"User {user_id} not found or not active")
                 return False
-            
-            # Check if user already exists on device
-            device_users = conn.get_users()
-            existing_user = None
-            
-            uid = int(user.user_id)
-            if uid > 65535:
-                uid = uid % 65536  # Wrap around for large IDs
-            
-            for device_user in device_users:
-                if device_user.user_id == str(user.user_id) or device_user.uid == uid:
-                    existing_user = device_user
-                    break
-            
-            try:
-                if existing_user:
-                    # User already exists - skip to avoid "Can't set user" error
-                    logging.info(f"User {user.user_id} already exists on device {target_ip} - skipping user creation")
-                else:
-                    # Create new user only if not exists
-                    conn.set_user(
-                        uid=uid,
-                        name=f"{user.first_name} {user.last_name}",
-                        privilege=0,
-                        password='',
-                        group_id='',
-                        user_id=str(user.user_id)
-                    )
-                    logging.info(f"Created user {user.user_id} on device {target_ip}")
+            user_id, first_name, last_name = user
+
+            # The pooled connection goes back to the pool however this block exits
+            with self._checkout(target_ip) as conn:
+                if not conn:
+                    logging.error(f"Cannot connect to device {target_ip}")
+                    return False
                 
-                self.disconnect_device(target_ip)
-                return True
+                uid = int(user_id)
+                if uid > 65535:
+                    uid = uid % 65536  # Wrap around for large IDs
                 
-            except Exception as e:
-                logging.error(f"Error setting user {user.user_id} on device {target_ip}: {e}")
-                self.disconnect_device(target_ip)
-                return False
+                # Check if user already exists on device, by user_id or uid
+                by_uid, by_user_id = self._user_index(self._cached_device_users(target_ip, conn))
+                existing_user = by_user_id.get(str(user_id)) or by_uid.get(uid)
+                
+                try:
+                    if existing_user:
+                        # User already exists - skip to avoid "Can't set user" error
+                        logging.info(f"User {user_id} already exists on device {target_ip} - skipping user creation")
+                    else:
+                        # Create new user only if not exists
+                        conn.set_user(
+                            uid=uid,
+                            name=f"{first_name} {last_name}",
+                            privilege=0,
+                            password='',
+                            group_id='',
+                            user_id=str(user_id)
+                        )
+                        self._remember_device_user(target_ip, uid, user_id)
+                        logging.info(f"Created user {user_id} on device {target_ip}")
+                    return True
+                    
+                except Exception as e:
+                    logging.error(f"Error setting user {user_id} on device {target_ip}: {e}")
+                    return False
 
         except Exception as e:
             logging.error(f"Error pushing user {user_id} to device {target_ip}: {e}")
@@ -1464,18 +1992,6 @@ class DeviceManager:
                 logging.error(f"Cannot connect to device {target_ip}")
                 return False
 
-            # Get all finger templates for users in this area
-            finger_templates = db.session.query(FingerTemplate).join(User).filter(
-                User.area_id == area_id,
-                User.status == 'Active'
-            ).all()
-
-            # Get all face templates for users in this area  
-            face_templates = db.session.query(FaceTemplate).join(User).filter(
-                User.area_id == area_id,
-                User.status == 'Active'
-            ).all()
-
             pushed_count = 0
             
             # Templates are not stored in DB - only synced between devices
@@ -1493,83 +2009,80 @@ class DeviceManager:
     def push_user_templates_to_device(self, target_ip, user_id):
         """Push specific user's biometric templates to device from other devices in same area"""
         try:
-            user = User.query.filter_by(user_id=user_id, status='Active').first()
-            if not user or not user.area_id:
-                logging.error(f"User {user_id} not found, not active, or no area assigned")
-                return False
-
-            # Get all devices in the same area
-            area_devices = Device.query.filter_by(area_id=user.area_id, online_status=True).all()
-            if len(area_devices) < 2:
-                logging.info(f"Only one device in area {user.area_id}, no template sync needed")
+            with _pooled_db() as db_conn:
+                user_row = db_conn.execute(
+                    "SELECT area_id FROM users WHERE user_id = ? AND status = 'Active'", (str(user_id),)
+                ).fetchone()
+                if not user_row or not user_row[0]:
+                    logging.error(f"User {user_id} not found, not active, or no area assigned")
+                    return False
+                area_id = user_row[0]
+
+                # Get all devices in the same area, most recently synced first
+                area_ips = [row[0] for row in db_conn.execute(
+                    "SELECT ip_address FROM devices WHERE area_id = ? AND online_status = 1 "
+                    "ORDER BY last_sync DESC", (area_id,))]
+            if len(area_ips) < 2:
+                logging.info(f"Only one device in area {area_id}, no template sync needed")
                 return True
 
-            target_conn = self.connect_device(target_ip)
-            if not target_conn:
-                logging.error(f"Cannot connect to target device {target_ip}")
-                return False
-
-            # Find user on target device
-            target_users = target_conn.get_users()
-            target_user = None
-            for device_user in target_users:
-                if str(device_user.user_id) == str(user_id):
-                    target_user = device_user
-                    break
-
-            if not target_user:
-                logging.error(f"User {user_id} not found on target device {target_ip}")
-                self.disconnect_device(target_ip)
-                return False
+            # One pooled target connection for the whole push
+            with self._checkout(target_ip) as target_conn:
+                if not target_conn:
+                    logging.error(f"Cannot connect to target device {target_ip}")
+                    return False
 
-            # Check if user already has templates on target device
-            try:
-                existing_templates = target_conn.get_user_template(uid=target_user.uid)
-                if existing_templates:
-                    logging.info(f"User {user_id} already has templates on device {target_ip}")
-                    self.disconnect_device(target_ip)
-                    return True
-            except:
-                pass
+                # Find user on target device
+                _, target_users_by_id = self._user_index(self._cached_device_users(target_ip, target_conn))
+                target_user = target_users_by_id.get(str(user_id))
 
-            # Find templates from other devices in the area
-            templates_found = False
-            for source_device in area_devices:
-                if source_device.ip_address == target_ip:
-                    continue
+                if not target_user:
+                    logging.error(f"User {user_id} not found on target device {target_ip}")
+                    return False
 
+                # Check if user already has templates on target device
                 try:
-                    source_conn = self.connect_device(source_device.ip_address)
-                    if not source_conn:
-                        continue
-
-                    source_users = source_conn.get_users()
-                    source_user = None
-                    for device_user in source_users:
-                        if str(device_user.user_id) == str(user_id):
-                            source_user = device_user
-                            break
-
-                    if source_user:
-                        # Get templates from source device
-                        try:
-                            user_templates = source_conn.get_user_template(uid=source_user.uid)
-                            if user_templates:
-                                # Push templates to target device
-                                target_conn.save_user_template(user=target_user, fingers=user_templates)
-                                templates_found = True
-                                logging.info(f"Successfully synced templates for user {user_id} from {source_device.ip_address} to {target_ip}")
-                                self.disconnect_device(source_device.ip_address)
-                                break
-                        except Exception as e:
-                            logging.error(f"Error syncing templates for user {user_id}: {e}")
-
-                    self.disconnect_device(source_device.ip_address)
-                except Exception as e:
-                    logging.error(f"Error connecting to source device {source_device.ip_address}: {e}")
-                    continue
+                    existing_templates = target_conn.get_user_template(uid=target_user.uid)
+                    if existing_templates:
+                        logging.info(f"User {user_id} already has templates on device {target_ip}")
+                        return True
+                except:
+                    pass
 
-            self.disconnect_device(target_ip)
+                source_ips = [ip for ip in area_ips if ip != target_ip]
+                result = None
+                # Try the device that supplied this user's templates last time, or the
+                # only other device in the area, before fanning out
+                preferred_ip = self._template_sources.get(str(user_id))
+                if len(source_ips) == 1 or preferred_ip in source_ips:
+                    first_ip = source_ips[0] if len(source_ips) == 1 else preferred_ip
+                    result = self._fetch_user_templates(first_ip, user_id)
+                    source_ips.remove(first_ip)
+
+                # Ask every remaining area device at once and take the first that has templates
+                futures = []
+                if not result and source_ips:
+                    futures = [
+                        self._pool.submit(self._fetch_user_templates, source_ip, user_id)
+                        for source_ip in source_ips
+                    ]
+                templates_found = False
+                try:
+                    results = [result] if result else (future.result() for future in as_completed(futures))
+                    for result in results:
+                        if not result:
+                            continue
+                        source_ip, user_templates = result
+                        # Push templates to target device
+                        target_conn.save_user_template(user=target_user, fingers=user_templates)
+                        self._template_sources[str(user_id)] = source_ip
+                        templates_found = True
+                        logging.info(f"Successfully synced templates for user {user_id} from {source_ip} to {target_ip}")
+                        break
+                finally:
+                    # Sources not yet started are skipped; running ones release their own connections
+                    for future in futures:
+                        future.cancel()
             
             if templates_found:
                 logging.info(f"Successfully pushed templates for user {user_id} to device {target_ip}")
@@ -1582,73 +2095,105 @@ class DeviceManager:
             logging.error(f"Error pushing user {user_id} templates to device {target_ip}: {e}")
             return False
 
-    def remove_terminated_users_from_device(self, ip_address):
-        """Remove terminated users from device - enhanced version"""
+    def _fetch_user_templates(self, ip_address, user_id):
+        """Read one user's templates from a device
+        
+        Returns:
+            tuple: (ip_address, templates), or None if the device has none for the user
+        """
+        try:
+            with self._checkout(ip_address) as conn:
+                if not conn:
+                    return None
+                _, users_by_id = self._user_index(self._cached_device_users(ip_address, conn))
+                device_user = users_by_id.get(str(user_id))
+                if not device_user:
+                    return None
+                templates = conn.get_user_template(uid=device_user.uid)
+            return (ip_address, templates) if templates else None
+        except Exception as e:
+            logging.error(f"Error reading templates for user {user_id} from {ip_address}: {e}")
+            return None
+
+    def push_user_templates_bulk(self, user_id, target_ips):
+        """Push one user's templates to several devices concurrently
+        
+        Returns:
+            dict: target ip -> result of push_user_templates_to_device
+        """
+        target_ips = list(target_ips)
+        if not target_ips:
+            return {}
+        # A separate pool: each push fans its source search out on self._pool
+        with ThreadPoolExecutor(max_workers=min(8, len(target_ips))) as pool:
+            results = pool.map(lambda ip: self.push_user_templates_to_device(ip, user_id), target_ips)
+            return dict(zip(target_ips, results))
+
+    def remove_terminated_users_from_device(self, ip_address, terminated_user_ids=None):
+        """Remove terminated users from device - enhanced version
+        
+        Callers sweeping several devices can pass terminated_user_ids loaded once.
+        """
         try:
+            if terminated_user_ids is None:
+                terminated_user_ids = get_terminated_user_ids()
+            
+            if not terminated_user_ids:
+                logging.info(f"No terminated users in database")
+                return 0
+
             conn = self.connect_device(ip_address)
             if not conn:
                 logging.error(f"Could not connect to device {ip_address}")
                 return 0
 
-            # Get all users from device
-            device_users = conn.get_users()
-            if not device_users:
-                logging.info(f"No users found on device {ip_address}")
-                self.disconnect_device(ip_address)
-                return 0
+            try:
+                # Get all users from device
+                device_uid_map = {str(u.user_id): u.uid for u in self._cached_device_users(ip_address, conn)}
+                if not device_uid_map:
+                    logging.info(f"No users found on device {ip_address}")
+                    return 0
 
-            # Get terminated users from database using direct SQLite query
-            import sqlite3
-            import os
-            
-            project_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(project_dir, 'instance', 'attendance.db')
-            
-            conn_db = sqlite3.connect(db_path)
-            cursor = conn_db.cursor()
-            cursor.execute("SELECT user_id FROM users WHERE status = 'Terminated'")
-            terminated_users = cursor.fetchall()
-            conn_db.close()
-            
-            terminated_user_ids = {str(user[0]) for user in terminated_users}
-            
-            if not terminated_user_ids:
-                logging.info(f"No terminated users in database")
-                conn.disconnect()
-                return 0
+                logging.info(f"Found {len(terminated_user_ids)} terminated users in database")
+                logging.info(f"Found {len(device_uid_map)} users on device {ip_address}")
 
-            logging.info(f"Found {len(terminated_user_ids)} terminated users in database")
-            logging.info(f"Found {len(device_users)} users on device {ip_address}")
+                # Only terminated users actually present on the device need a delete
+                to_delete = terminated_user_ids & device_uid_map.keys()
+                if not to_delete:
+                    logging.info(f"No terminated users on device {ip_address}")
+                    return 0
 
-            removed_count = 0
-            for device_user in device_users:
-                try:
-                    # Check if device user is terminated in database
-                    if str(device_user.user_id) in terminated_user_ids:
-                        logging.info(f"Attempting to delete terminated user {device_user.user_id} (UID: {device_user.uid}) from device {ip_address}")
+                removed_count = 0
+                failed_deletes = []
+                for user_id in to_delete:
+                    uid = device_uid_map[user_id]
+                    try:
+                        logging.info(f"Attempting to delete terminated user {user_id} (UID: {uid}) from device {ip_address}")
                         
-                        # Try to delete user from device
-                        result = conn.delete_user(uid=device_user.uid)
-                        if result:
-                            removed_count += 1
-                            logging.info(f"Successfully removed terminated user {device_user.user_id} from device {ip_address}")
-                        else:
-                            logging.warning(f"Failed to remove user {device_user.user_id} from device {ip_address}")
-                    
-                except Exception as e:
-                    logging.error(f"Error removing user {device_user.user_id} from device {ip_address}: {e}")
-                    continue
+                        # pyzk returns None on success and raises on failure
+                        conn.delete_user(uid=uid)
+                        removed_count += 1
+                        logging.info(f"Successfully removed terminated user {user_id} from device {ip_address}")
+                        
+                    except Exception as e:
+                        failed_deletes.append(user_id)
+                        logging.error(f"Error removing user {user_id} from device {ip_address}: {e}")
+                        continue
+                self._invalidate_device_users(ip_address)
 
-            # Verify removal by checking users again
-            updated_users = conn.get_users()
-            remaining_terminated = [u for u in updated_users if str(u.user_id) in terminated_user_ids]
-            
-            if remaining_terminated:
-                logging.warning(f"Still {len(remaining_terminated)} terminated users remain on device {ip_address}")
-                for user in remaining_terminated:
-                    logging.warning(f"Terminated user still on device: {user.user_id}")
+                # Re-read the device only when some deletes failed, and only
+                # check those users
+                if failed_deletes:
+                    device_user_ids = {str(u.user_id) for u in conn.get_users() or []}
+                    remaining_terminated = [user_id for user_id in failed_deletes if user_id in device_user_ids]
+                    
+                    if remaining_terminated:
+                        logging.warning(f"Still {len(remaining_terminated)} terminated users remain on device {ip_address}")
+                        for user_id in remaining_terminated:
+                            logging.warning(f"Terminated user still on device: {user_id}")
+            finally:
+                self.release_device(ip_address, conn)
 
-            self.disconnect_device(ip_address)
             logging.info(f"Removed {removed_count} terminated users from device {ip_address}")
             return removed_count
 
@@ -1658,18 +2203,44 @@ class DeviceManager:
 
     def _get_status_text(self, status_code):
         """Convert status code to text"""
-        status_map = {
-            0: 'Check In',
-            1: 'Check Out',
-            2: 'Break Out',
-            3: 'Break In',
-            4: 'OT In',
-            5: 'OT Out'
-        }
-        return status_map.get(status_code, 'Unknown')
+        if isinstance(status_code, int) and 0 <= status_code < len(_STATUS_TEXTS):
+            return _STATUS_TEXTS[status_code]
+        return 'Unknown'
+
+    @staticmethod
+    def _count_recent_logs(logs, today):
+        """Single pass over attendance logs
+        
+        Returns:
+            tuple: (total, today's count, yesterday's count)
+        """
+        # Compare against midnight boundaries rather than building a date per log
+        today_start = datetime(today.year, today.month, today.day)
+        yesterday_start = today_start - timedelta(days=1)
+        tomorrow_start = today_start + timedelta(days=1)
+        total = today_count = yesterday_count = 0
+        for log in logs:
+            total += 1
+            timestamp = getattr(log, 'timestamp', None)
+            if timestamp is None or timestamp < yesterday_start or timestamp >= tomorrow_start:
+                continue
+            if timestamp >= today_start:
+                today_count += 1
+            else:
+                yesterday_count += 1
+        return total, today_count, yesterday_count
+
+    def get_device_data(self, ip, port=4370, timeout=3, ttl=300):
+        """Get device statistics and information - using proper ZK attributes
+        
+        Results are cached per IP for ttl seconds, since the log counts need
+        the whole attendance buffer.
+        """
+        cache_key = f"device_data:{ip}"
+        cached_data = device_cache.get(cache_key)
+        if cached_data is not None:
+            return dict(cached_data)
 
-    def get_device_data(self, ip, port=4370, timeout=3):
-        """Get device statistics and information - using proper ZK attributes"""
         data = {
             'serial': "N/A",
             'area': "N/A",
@@ -1685,28 +2256,26 @@ class DeviceManager:
             if not ZK_AVAILABLE:
                 return data
 
-            zk_instance = ZK(ip, port=port, timeout=timeout)
-            conn = zk_instance.connect()
+            with self._checkout(ip, timeout) as conn:
+                if not conn:  # Check to ensure connection is established
+                    return data
 
-            if conn:  # Check to ensure connection is established
                 data['serial'] = conn.get_serialnumber()
 
-                # Use minimal data retrieval
-                users = conn.get_users()
-                data['employee_count'] = len(users) if users else 0
+                # Counts come from one small sizes packet, not the user table
+                conn.read_sizes()
+                data['employee_count'] = getattr(conn, 'users', 0)
                 data['fingerprint_count'] = getattr(conn, 'fingers', 0)
                 data['face_count'] = getattr(conn, 'faces', 0)
+                data['total_logs'] = getattr(conn, 'records', 0)
 
-                # Add back the attendance logs counting
+                # Today/yesterday still need the logs, counted in one pass
                 logs = conn.get_attendance()
-                from datetime import datetime, timedelta
-                today = datetime.now().date()
-                yesterday = today - timedelta(days=1)
-                data['total_logs'] = len(logs) if logs else 0
-                data['yesterday_logs'] = len([log for log in logs if log.timestamp.date() == yesterday]) if logs else 0
-                data['today_logs'] = len([log for log in logs if log.timestamp.date() == today]) if logs else 0
+                if logs:
+                    data['total_logs'], data['today_logs'], data['yesterday_logs'] = \
+                        self._count_recent_logs(logs, datetime.now().date())
 
-                conn.disconnect()
+            device_cache.set(cache_key, dict(data), ttl)
 
         except Exception as e:
             logging.error(f"Failed to retrieve data for {ip}: {e}")
@@ -1716,28 +2285,17 @@ class DeviceManager:
     def comprehensive_device_sync(self, ip_address, area_id):
         """Comprehensive device sync: sync users and templates TO device, remove terminated users, sync time"""
         try:
-            import sqlite3
-            import os
-            
             logging.info(f"Starting comprehensive sync for device {ip_address}")
             
-            # Use absolute path for database
-            project_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(project_dir, 'instance', 'attendance.db')
-            
             # Get device info from database
-            conn_db = sqlite3.connect(db_path)
-            cursor = conn_db.cursor()
-            cursor.execute("SELECT name, area_id FROM devices WHERE ip_address = ?", (ip_address,))
-            device_info = cursor.fetchone()
+            with _pooled_db() as conn_db:
+                device_info = conn_db.execute("SELECT name, area_id FROM devices WHERE ip_address = ?", (ip_address,)).fetchone()
             if not device_info:
                 logging.error(f"Device {ip_address} not found in database")
-                conn_db.close()
                 return {'success': False, 'error': 'Device not found'}
             
             device_name, device_area_id = device_info
             actual_area_id = area_id or device_area_id
-            conn_db.close()
             
             # Connect to device
             conn = self.connect_device(ip_address)
@@ -1787,15 +2345,12 @@ class DeviceManager:
                     users_added = 0
                     if actual_area_id:
                         # Get active users for this area using direct SQLite query
-                        conn_db = sqlite3.connect(db_path)
-                        cursor = conn_db.cursor()
-                        cursor.execute("""
-                            SELECT user_id, first_name, last_name 
-                            FROM users 
-                            WHERE area_id = ? AND status = 'Active'
-                        """, (actual_area_id,))
-                        active_users = cursor.fetchall()
-                        conn_db.close()
+                        with _pooled_db() as conn_db:
+                            active_users = conn_db.execute("""
+                                SELECT user_id, first_name, last_name 
+                                FROM users 
+                                WHERE area_id = ? AND status = 'Active'
+                            """, (actual_area_id,)).fetchall()
                         
                         # Get existing users on device
                         device_users = conn.get_users() or []
@@ -1817,6 +2372,7 @@ class DeviceManager:
                                         group_id='',
                                         user_id=str(user_id)
                                     )
+                                    self._remember_device_user(ip_address, next_uid, user_id)
                                     users_added += 1
                                     next_uid += 1
                                     logging.info(f"Added user {user_id} to device {ip_address}")
@@ -1859,9 +2415,9 @@ class DeviceManager:
                     logging.warning(f"Error collecting logs from device {ip_address}: {e}")
                 
             finally:
-                # Always disconnect
+                # Always hand the connection back to the pool
                 try:
-                    conn.disconnect()
+                    self.release_device(ip_address, conn)
                 except:
                     pass
             
@@ -10,6 +10,7 @@ import time
 import threading
 import os
 import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional, Any
 from zk import ZK
@@ -668,6 +669,15 @@ class EnhancedDeviceSync:
                 logging.debug(f"Device {ip_address} does not have get_device_info method")
                 support_info['device_info'] = {}
             
+            # The faces attribute is only filled in by read_sizes(); one small
+            # sizes packet populates it without fetching the user table
+            if not users_fetched and hasattr(conn, 'read_sizes'):
+                try:
+                    conn.read_sizes()
+                    users_fetched = True
+                except Exception as e:
+                    logging.debug(f"Could not read sizes from {ip_address}: {e}")
+            
             # Method 1: Check faces attribute (MOST RELIABLE after users are fetched)
             if hasattr(conn, 'faces'):
                 face_count = conn.faces
@@ -744,15 +754,16 @@ class EnhancedDeviceSync:
         source_photos = source_data['user_photos']
         
         # Find users missing on target device
-        users_to_add = [user for user_id, user in source_users.items() 
-                       if user_id not in target_users]
+        # dict key views support set difference: one hash pass over each side
+        missing_user_ids = source_users.keys() - target_users.keys()
+        users_to_add = [source_users[user_id] for user_id in missing_user_ids]
         
         if users_to_add:
             logging.info(f"Adding {len(users_to_add)} users from {source_ip} to {target_ip}")
             
             # Get existing UIDs on target device to avoid conflicts
             existing_uids = {user.uid for user in target_users.values()}
-            max_uid = max(existing_uids) if existing_uids else 0
+            max_uid = max(existing_uids, default=0)
             
             for user in users_to_add:
                 try:
@@ -1065,6 +1076,58 @@ class EnhancedDeviceSync:
             # Remove from sync queue
             self.sync_in_progress.discard(sync_key)
     
+    def _collect_device_data(self, device_id: str, ip_address: str) -> Optional[Tuple[str, Any, Dict[str, Any], Dict[str, Any]]]:
+        """Connect to one device and read its data, returning None if it is unreachable"""
+        conn = self.connect_to_device(ip_address)
+        if not conn:
+            return None
+        
+        try:
+            # Get device data first (this will fetch users and populate faces attribute)
+            data = self.get_device_data(conn, ip_address)
+            data['device_id'] = device_id
+            
+            # Check face support AFTER fetching users (for accurate detection)
+            face_support = self.check_device_face_support(conn, ip_address, users_fetched=True)
+        except Exception as e:
+            logging.error(f"Error collecting data from {ip_address}: {e}")
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+            return None
+        
+        logging.info(f"Device {ip_address}: Face support = {face_support['face_templates_supported']} ({face_support['face_count']} faces)")
+        return ip_address, conn, data, face_support
+    
+    def build_union_data(self, device_data: Dict[str, Dict[str, Any]], primary_ip: str,
+                         valid_user_ids=None) -> Dict[str, Any]:
+        """
+        Merge every device's users and fingerprints into one source index in a single pass.
+        The primary wins ties; other devices only contribute users or fingerprints it lacks.
+        Users absent from the primary are only taken when listed in valid_user_ids.
+        """
+        primary_data = device_data[primary_ip]
+        users = dict(primary_data['users'])
+        fingerprints = dict(primary_data['fingerprint_templates'])
+        
+        for ip, data in device_data.items():
+            if ip == primary_ip:
+                continue
+            for user_id, user in data['users'].items():
+                if user_id not in users and valid_user_ids and user_id in valid_user_ids:
+                    users[user_id] = user
+            for user_id, templates in data['fingerprint_templates'].items():
+                if templates and user_id in users and not fingerprints.get(user_id):
+                    fingerprints[user_id] = templates
+        
+        return {
+            'users': users,
+            'fingerprint_templates': fingerprints,
+            'face_templates': primary_data['face_templates'],
+            'user_photos': primary_data['user_photos']
+        }
+    
     def sync_devices_in_area(self, area_id: int) -> Dict[str, Any]:
         """
         Comprehensive sync of all devices in an area with performance improvements
@@ -1120,20 +1183,14 @@ class EnhancedDeviceSync:
             device_data = {}
             face_support_status = {}
             
-            for device_id, ip_address in devices:
-                conn = self.connect_to_device(ip_address)
-                if conn:
-                    device_connections[ip_address] = conn
-                    
-                    # Get device data first (this will fetch users and populate faces attribute)
-                    device_data[ip_address] = self.get_device_data(conn, ip_address)
-                    device_data[ip_address]['device_id'] = device_id
-                    
-                    # Check face support AFTER fetching users (for accurate detection)
-                    face_support = self.check_device_face_support(conn, ip_address, users_fetched=True)
-                    face_support_status[ip_address] = face_support
-                    
-                    logging.info(f"Device {ip_address}: Face support = {face_support['face_templates_supported']} ({face_support['face_count']} faces)")
+            # Each device is its own connection, so collect them in parallel
+            with ThreadPoolExecutor(max_workers=min(8, len(devices))) as pool:
+                results = list(pool.map(lambda device: self._collect_device_data(*device), devices))
+            
+            for ip_address, conn, data, face_support in filter(None, results):
+                device_connections[ip_address] = conn
+                device_data[ip_address] = data
+                face_support_status[ip_address] = face_support
             
             if not device_data:
                 return {
@@ -1179,7 +1236,7 @@ class EnhancedDeviceSync:
                 except Exception as e:
                     logging.warning(f"⚠️ Failed to sync time to device {target_ip}: {e}")
             
-            # Step 5: Comprehensive sync from primary to all other devices
+            # Step 5: Comprehensive sync of the area-wide union to every device
             total_users_synced = 0
             total_templates_synced = 0
             total_face_synced = 0
@@ -1188,6 +1245,18 @@ class EnhancedDeviceSync:
             
             primary_conn = device_connections[primary_ip]
             
+            # One merged index of users and fingerprints across all devices, so each
+            # device is diffed once against it instead of only against the primary
+            union_data = self.build_union_data(
+                device_data, primary_ip, self.get_valid_users_for_device(area_id))
+            try:
+                result = self.sync_between_devices(
+                    primary_conn, primary_conn, union_data, primary_data, primary_ip, primary_ip)
+                total_users_synced += result['users_synced']
+                total_templates_synced += result['templates_synced']
+            except Exception as e:
+                logging.error(f"Error syncing area union to primary {primary_ip}: {e}")
+            
             # Connect fpmachine for face/photo sync (only for supported devices)
             for ip in device_connections.keys():
                 if face_support_status[ip]['face_templates_supported']:
@@ -1204,7 +1273,7 @@ class EnhancedDeviceSync:
                     # Sync users and fingerprints (pyzk)
                     result = self.sync_between_devices(
                         primary_conn, device_connections[target_ip],
-                        primary_data, target_data,
+                        union_data, target_data,
                         primary_ip, target_ip
                     )
                     
@@ -1,4 +1,7 @@
 import logging
+import queue
+import threading
+import time
 import traceback
 from datetime import datetime
 from flask import request, has_request_context
@@ -6,16 +9,27 @@ from app import db
 from models import ErrorLog
 
 class DatabaseLogHandler(logging.Handler):
-    """Custom logging handler to store errors in database"""
+    """Custom logging handler to store errors in database
     
-    def __init__(self):
+    emit() only queues the record; a writer thread inserts them in batches
+    so a burst of errors costs one commit per batch, not one per record.
+    """
+    batch_size = 100
+    flush_interval = 1.0  # seconds to wait for a batch to fill
+    
+    def __init__(self, max_queue_size=10000):
         super().__init__()
         self.setLevel(logging.WARNING)  # Only capture WARNING and ERROR
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # Set on the writer thread so records logged while saving aren't re-queued
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._writer_loop, name='error-log-writer', daemon=True)
+        self._writer.start()
         
     def emit(self, record):
         try:
             # Only log WARNING and ERROR levels
-            if record.levelno < logging.WARNING:
+            if record.levelno < logging.WARNING or getattr(self._local, 'writing', False):
                 return
                 
             # Get request context if available
@@ -37,26 +51,75 @@ class DatabaseLogHandler(logging.Handler):
             if record.exc_info:
                 traceback_str = ''.join(traceback.format_exception(*record.exc_info))
             
-            # Create error log entry
-            error_log = ErrorLog(
-                level=record.levelname,
-                module=record.module if hasattr(record, 'module') else record.name,
-                message=message,
-                traceback=traceback_str,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-            
-            # Save to database
-            db.session.add(error_log)
-            db.session.commit()
+            self.enqueue({
+                'timestamp': datetime.utcnow(),
+                'level': record.levelname,
+                'module': record.module if hasattr(record, 'module') else record.name,
+                'message': message,
+                'traceback': traceback_str,
+                'ip_address': ip_address,
+                'user_agent': user_agent
+            })
             
         except Exception as e:
             # Don't let logging errors crash the application
             print(f"Error logging to database: {e}")
+    
+    def enqueue(self, entry):
+        """Queue an ErrorLog mapping; drop it rather than block if the writer is behind"""
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            return False
+    
+    def _writer_loop(self):
+        """Drain queued records, committing up to batch_size at a time"""
+        self._local.writing = True
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+    
+    def _write_batch(self, batch):
+        try:
+            from app import app
+            with app.app_context():
+                db.session.bulk_insert_mappings(ErrorLog, batch)
+                db.session.commit()
+        except Exception as e:
+            print(f"Error logging to database: {e}")
+    
+    def close(self):
+        """Write whatever is still queued before the handler goes away"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._local.writing = True
+            try:
+                self._write_batch(batch)
+            finally:
+                self._local.writing = False
+        super().close()
+
+# Handler installed by setup_error_logging(); log_error() queues through it too
+_db_handler = None
 
 def setup_error_logging():
     """Setup database error logging"""
+    global _db_handler
     try:
         # Get the root logger
         root_logger = logging.getLogger()
@@ -64,10 +127,12 @@ def setup_error_logging():
         # Check if handler already exists
         for handler in root_logger.handlers:
             if isinstance(handler, DatabaseLogHandler):
+                _db_handler = handler
                 return
         
         # Add database handler
         db_handler = DatabaseLogHandler()
+        _db_handler = db_handler
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
@@ -82,20 +147,26 @@ def setup_error_logging():
 def log_error(message, level='ERROR', module='system', traceback_str=None):
     """Manually log an error to the database"""
     try:
-        from app import app, db
-        from models import ErrorLog
-        from flask import request, has_request_context
+        in_request = has_request_context()
+        entry = {
+            'timestamp': datetime.utcnow(),
+            'level': level,
+            'module': module,
+            'message': message,
+            'traceback': traceback_str,
+            'ip_address': request.remote_addr if in_request else None,
+            'user_agent': request.headers.get('User-Agent', '')[:256] if in_request else None
+        }
+        
+        # With the database handler running, its writer thread does the insert
+        if _db_handler is not None and _db_handler.enqueue(entry):
+            return
         
+        from app import app
+        
+        # A fresh app context gets its own session, leaving the caller's untouched
         with app.app_context():
-            error_log = ErrorLog(
-                level=level,
-                module=module,
-                message=message,
-                traceback=traceback_str,
-                ip_address=request.remote_addr if has_request_context() and request else None,
-                user_agent=request.headers.get('User-Agent') if has_request_context() and request else None
-            )
-            db.session.add(error_log)
+            db.session.add(ErrorLog(**entry))
             db.session.commit()
             print(f"Successfully logged {level} to database: {message}")
     except Exception as e:
@@ -106,14 +177,26 @@ def log_error(message, level='ERROR', module='system', traceback_str=None):
         if traceback_str:
             logging.error(f"Traceback: {traceback_str}")
 
-def cleanup_old_logs(days=30):
+def cleanup_old_logs(days=30, batch_size=10000):
     """Clean up error logs older than specified days"""
     try:
         from datetime import timedelta
+        from sqlalchemy import bindparam, DateTime
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        deleted_count = ErrorLog.query.filter(ErrorLog.timestamp < cutoff_date).delete()
-        db.session.commit()
+        # Raw DELETE over the timestamp index, in chunks so one huge backlog
+        # doesn't hold a single long write transaction
+        delete_batch = db.text(
+            "DELETE FROM error_logs WHERE id IN "
+            "(SELECT id FROM error_logs WHERE timestamp < :cutoff LIMIT :batch_size)"
+        ).bindparams(bindparam('cutoff', type_=DateTime))
+        deleted_count = 0
+        while True:
+            result = db.session.execute(delete_batch, {'cutoff': cutoff_date, 'batch_size': batch_size})
+            db.session.commit()
+            deleted_count += result.rowcount
+            if result.rowcount < batch_size:
+                break
         
         if deleted_count > 0:
             logging.info(f"Cleaned up {deleted_count} old error logs")
@@ -60,6 +60,13 @@ class AttendanceLog(db.Model):
     status = db.Column(db.String(32))
     exported_flag = db.Column(db.Boolean, default=False, index=True)
 
+    __table_args__ = (
+        # Serves the export's "pending rows in time order" scan
+        db.Index('ix_logs_exported_ts', 'exported_flag', 'timestamp'),
+        # One row per device punch; also serves the log sync existence check
+        db.Index('ux_attlog', 'device_id', 'user_id', 'timestamp', unique=True),
+    )
+
     def __repr__(self):
         return f"<AttendanceLog {self.user_id} {self.timestamp}>"
 
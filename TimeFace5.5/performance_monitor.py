@@ -1,8 +1,11 @@
 import time
 import functools
 import logging
+import threading
+from contextlib import contextmanager
 from flask import request, g
 from datetime import datetime
+from sqlalchemy import event
 
 class PerformanceMonitor:
     """Simple performance monitoring for Flask routes"""
@@ -97,3 +100,21 @@ def init_performance_monitoring(app):
                 logging.warning(f"Very slow request: {request.endpoint} took {duration:.2f}s")
         
         return response
+
+@contextmanager
+def count_queries(engine, label, expected):
+    """Count SQL statements issued by this thread inside the block and warn past expected"""
+    counter = {'count': 0}
+    thread_id = threading.get_ident()
+    
+    def before_cursor_execute(*args):
+        if threading.get_ident() == thread_id:
+            counter['count'] += 1
+    
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        if counter['count'] > expected:
+            logging.warning(f"{label} issued {counter['count']} queries (expected at most {expected})")
@@ -2,6 +2,7 @@ from flask import render_template, request, jsonify, redirect, url_for, flash, s
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload, raiseload
 import pandas as pd
 import io
 import base64
@@ -9,8 +10,8 @@ import socket
 from app import app, db
 from models import *
 from device_manager import DeviceManager
-from utils import get_setting, set_setting
-from cache_manager import get_device_info_cached, invalidate_device_cache, device_cache
+from utils import get_setting, set_setting, clear_setting_cache
+from cache_manager import get_device_info_cached, invalidate_device_cache, invalidate_terminated_users_cache, device_cache
 import logging
 import threading
 
@@ -346,6 +347,7 @@ def update_device(device_id):
         device.area_id = data.get('area_id')
 
         db.session.commit()
+        device_manager.invalidate_device_meta()
 
         return jsonify({'success': True, 'message': 'Device updated successfully', 'close_modal': True})
     except Exception as e:
@@ -359,6 +361,7 @@ def delete_device(device_id):
         device = Device.query.get_or_404(device_id)
         db.session.delete(device)
         db.session.commit()
+        device_manager.invalidate_device_meta()
 
         return jsonify({'success': True, 'message': 'Device deleted successfully'})
     except Exception as e:
@@ -455,16 +458,14 @@ def devices_status():
         devices = Device.query.all()
         status_list = []
 
+        # Check actual device status in real-time, probing all devices concurrently
+        online_map = device_manager.check_devices_online(device.ip_address for device in devices)
+
         for device in devices:
-            # Check actual device status in real-time for more accurate results
-            try:
-                online = device_manager.is_device_online(device.ip_address)
-                # Update database if status changed
-                if device.online_status != online:
-                    device.online_status = online
-            except Exception as e:
-                logging.error(f"Error checking device {device.name} status: {e}")
-                online = device.online_status  # Fall back to cached status
+            online = online_map.get(device.ip_address, False)
+            # Update database if status changed
+            if device.online_status != online:
+                device.online_status = online
 
             device_info = {
                 'user_count': 0,
@@ -1015,14 +1016,20 @@ def add_user():
                     # Add user to device with proper UID
                     conn = device_manager.connect_device(device.ip_address)
                     if conn:
-                        conn.set_user(
-                            uid=next_uid,
-                            name=f"{user.first_name} {user.last_name}".strip(),
-                            privilege=0,
-                            password='',
-                            group_id='',
-                            user_id=user.user_id
-                        )
+                        try:
+                            user_name = f"{user.first_name} {user.last_name}".strip()
+                            conn.set_user(
+                                uid=next_uid,
+                                name=user_name,
+                                privilege=0,
+                                password='',
+                                group_id='',
+                                user_id=user.user_id
+                            )
+                            # Keep the shared device user snapshot in step with the write
+                            device_manager._remember_device_user(device.ip_address, next_uid, user.user_id, user_name)
+                        finally:
+                            device_manager.release_device(device.ip_address, conn)
                         synced_devices += 1
                         logging.info(f"Added user {user.user_id} to device {device.name} with UID {next_uid}")
                 except Exception as e:
@@ -1072,11 +1079,14 @@ def update_user(user_id):
         user.first_name = data['first_name']
         user.last_name = data['last_name']
         user.job_description = data.get('job_description')
+        old_status = user.status
         user.status = data.get('status', 'Active')
         old_area_id = user.area_id
         user.area_id = data.get('area_id')
 
         db.session.commit()
+        if user.status != old_status:
+            invalidate_terminated_users_cache()
 
         # Sync to devices if area changed
         if old_area_id != user.area_id:
@@ -1105,18 +1115,22 @@ def sync_user_to_devices(user_id):
             devices = Device.query.filter_by(area_id=user.area_id, online_status=True).all()
             synced_count = 0
 
+            pushed_devices = []
             for device in devices:
                 try:
                     # Push specific user to device
                     device_manager.push_single_user_to_device(device.ip_address, user.user_id)
-                    # Push user's templates to device
-                    device_manager.push_user_templates_to_device(device.ip_address, user.user_id)
-                    synced_count += 1
-                    logging.info(f"Synced user {user.user_id} and templates to device {device.name}")
+                    pushed_devices.append(device)
                 except Exception as e:
                     logging.error(f"Error syncing user {user.user_id} to device {device.name}: {e}")
                     continue
 
+            # Push user's templates to all devices concurrently
+            device_manager.push_user_templates_bulk(user.user_id, [device.ip_address for device in pushed_devices])
+            for device in pushed_devices:
+                synced_count += 1
+                logging.info(f"Synced user {user.user_id} and templates to device {device.name}")
+
             return jsonify({'success': True, 'message': f'User synced to {synced_count} devices'})
         else:
             return jsonify({'success': False, 'message': 'User has no area assigned'})
@@ -1151,7 +1165,8 @@ def export_table(table_name):
         output = io.BytesIO()
 
         if table_name == 'devices':
-            devices = Device.query.all()
+            # Load the area with the devices and fail loudly on any other lazy load
+            devices = Device.query.options(joinedload(Device.area_obj), raiseload('*')).all()
             data = []
             for device in devices:
                 data.append({
@@ -1166,7 +1181,7 @@ def export_table(table_name):
                 })
 
         elif table_name == 'users':
-            users = User.query.all()
+            users = User.query.options(joinedload(User.area_obj), raiseload('*')).all()
             data = []
             for user in users:
                 data.append({
@@ -1189,7 +1204,19 @@ def export_table(table_name):
             end_date = request.args.get('end_date')
             exported = request.args.get('exported')
 
-            query = AttendanceLog.query
+            # Join users and devices up front instead of looking them up per log row
+            query = db.session.query(
+                AttendanceLog.user_id,
+                AttendanceLog.device_id,
+                AttendanceLog.area,
+                AttendanceLog.timestamp,
+                AttendanceLog.status,
+                AttendanceLog.exported_flag,
+                User.first_name,
+                User.last_name,
+                Device.name.label('device_name')
+            ).outerjoin(User, AttendanceLog.user_id == User.user_id)\
+             .outerjoin(Device, AttendanceLog.device_id == Device.device_id)
 
             if device_id:
                 query = query.filter(AttendanceLog.device_id == device_id)
@@ -1211,13 +1238,11 @@ def export_table(table_name):
             logs = query.order_by(AttendanceLog.timestamp.desc()).all()
             data = []
             for log in logs:
-                user = User.query.filter_by(user_id=log.user_id).first()
-                device = Device.query.filter_by(device_id=log.device_id).first()
                 data.append({
                     'User ID': log.user_id,
-                    'User Name': f"{user.first_name} {user.last_name}" if user else 'Unknown',
+                    'User Name': f"{log.first_name} {log.last_name}" if log.first_name is not None else 'Unknown',
                     'Device ID': log.device_id,
-                    'Device Name': device.name if device else 'Unknown',
+                    'Device Name': log.device_name or 'Unknown',
                     'Area': log.area,
                     'Date': log.timestamp.strftime('%Y-%m-%d'),
                     'Time': log.timestamp.strftime('%H:%M:%S'),
@@ -1227,13 +1252,16 @@ def export_table(table_name):
 
         elif table_name == 'areas':
             areas = Area.query.all()
+            # Two grouped counts instead of two dynamic-relationship COUNTs per area
+            device_counts = dict(db.session.query(Device.area_id, db.func.count(Device.id)).group_by(Device.area_id).all())
+            user_counts = dict(db.session.query(User.area_id, db.func.count(User.id)).group_by(User.area_id).all())
             data = []
             for area in areas:
                 data.append({
                     'Area ID': area.id,
                     'Area Name': area.name,
-                    'Device Count': area.devices.count(),
-                    'User Count': area.users.count()
+                    'Device Count': device_counts.get(area.id, 0),
+                    'User Count': user_counts.get(area.id, 0)
                 })
 
         elif table_name == 'admin_users':
@@ -2386,6 +2414,7 @@ def device_usage():
                 db.session.add(setting)
         
         db.session.commit()
+        clear_setting_cache()
         
         # Restart scheduler to apply new settings
         try:
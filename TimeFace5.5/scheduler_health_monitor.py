@@ -9,6 +9,7 @@ import logging
 import subprocess
 import sys
 import os
+import signal
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -32,67 +33,119 @@ class SchedulerHealthMonitor:
         self.restart_cooldown = 300  # 5 minutes between restart attempts
         self.last_restart_time = None
         self.restart_count = 0
+        # Timestamp of the newest 'health check - OK' line seen in the log
+        self._last_known_healthy_at = None
         
+    @staticmethod
+    def pid_exists(pid):
+        """Check whether a process with this PID is alive without spawning a subprocess"""
+        if pid <= 0:
+            return False
+        try:
+            import psutil
+            return psutil.pid_exists(pid)
+        except ImportError:
+            pass
+        
+        if os.name == 'nt':
+            import ctypes
+            PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+            if not handle:
+                return False
+            kernel32.CloseHandle(handle)
+            return True
+        
+        # Unix-like systems: signal 0 only checks for existence
+        try:
+            os.kill(pid, 0)
+            return True
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+    
     def is_scheduler_running(self):
         """Check if scheduler service is running"""
         try:
             import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    cmdline = proc.info['cmdline']
-                    if cmdline and 'scheduler_service.py' in ' '.join(cmdline):
-                        return proc.info['pid']
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            return None
         except ImportError:
-            # Fallback: check PID file
-            pid_file = self.project_dir / 'scheduler.pid'
-            if pid_file.exists():
-                try:
-                    with open(pid_file, 'r') as f:
-                        pid = int(f.read().strip())
-                    
-                    # Check if process exists (Windows)
-                    if os.name == 'nt':
-                        result = subprocess.run(['tasklist', '/FI', f'PID eq {pid}'], 
-                                              capture_output=True, text=True)
-                        return pid if str(pid) in result.stdout else None
-                    else:
-                        # Unix-like systems
-                        try:
-                            os.kill(pid, 0)
-                            return pid
-                        except OSError:
-                            return None
-                except:
-                    return None
+            psutil = None
+        
+        # The PID written by start_scheduler.py is checked directly, but the
+        # file can be stale and its PID reused, so confirm what runs there
+        pid_file = self.project_dir / 'scheduler.pid'
+        if pid_file.exists():
+            try:
+                with open(pid_file, 'r') as f:
+                    pid = int(f.read().strip())
+                if psutil is None:
+                    return pid if self.pid_exists(pid) else None
+                if 'scheduler_service.py' in ' '.join(psutil.Process(pid).cmdline()):
+                    return pid
+            except Exception:
+                pass
+        
+        # No live scheduler at the recorded PID: scan the process table
+        if psutil is None:
             return None
+        for proc in psutil.process_iter(['pid', 'cmdline']):
+            try:
+                cmdline = proc.info['cmdline']
+                if cmdline and 'scheduler_service.py' in ' '.join(cmdline):
+                    return proc.info['pid']
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return None
+    
+    @staticmethod
+    def read_log_tail(log_file, max_lines=50, block_size=8192):
+        """Return the last max_lines lines of a file, reading backwards from the end"""
+        with open(log_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            # One extra newline so the first kept line is complete
+            while position > 0 and data.count(b'\n') <= max_lines:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        return lines[-max_lines:]
     
     def check_scheduler_health(self):
         """Check if scheduler is healthy by examining log file"""
+        # A health line already seen stays valid for 10 minutes; no need to reopen the log
+        now = datetime.now()
+        if self._last_known_healthy_at and now - self._last_known_healthy_at < timedelta(minutes=10):
+            return True
+        
         try:
             log_file = self.project_dir / 'scheduler_service.log'
             if not log_file.exists():
                 return False
             
-            # Check if there's been a health check in the last 10 minutes
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
+            # Check if there's been a health check in the last 10 minutes,
+            # reading only the end of the log rather than the whole file
+            lines = self.read_log_tail(log_file, max_lines=50)
                 
+            # asctime stamps ('%Y-%m-%d %H:%M:%S,mmm') sort lexicographically, so
+            # compare against a threshold string instead of parsing each line
+            threshold = (now - timedelta(minutes=10)).strftime('%Y-%m-%d %H:%M:%S')
+            
             # Look for recent health check
-            for line in reversed(lines[-50:]):  # Check last 50 lines
+            for line in reversed(lines):  # Check last 50 lines
                 if 'health check - OK' in line:
-                    try:
-                        # Extract timestamp
-                        timestamp_str = line.split(' - ')[0]
-                        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-                        
+                    # Extract timestamp
+                    timestamp_str = line.split(' - ')[0][:19]
+                    if len(timestamp_str) == 19 and timestamp_str[4] == '-':
                         # Check if it's within last 10 minutes
-                        if datetime.now() - timestamp < timedelta(minutes=10):
-                            return True
-                    except:
-                        continue
+                        if timestamp_str <= threshold:
+                            return False
+                        self._last_known_healthy_at = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+                        return True
             
             return False
             
@@ -117,20 +170,26 @@ class SchedulerHealthMonitor:
         
         try:
             logging.info("Attempting to restart scheduler service...")
+            self._last_known_healthy_at = None
+            old_pid = self.is_scheduler_running()
             
             # Stop scheduler
             stop_cmd = [sys.executable, 'start_scheduler.py', 'stop']
             subprocess.run(stop_cmd, cwd=self.project_dir, timeout=30)
             
-            # Wait a moment
-            time.sleep(5)
+            # Wait for the old process to exit rather than sleeping a fixed time
+            if old_pid and not self.wait_for(lambda: not self.pid_exists(old_pid), timeout=15):
+                logging.warning(f"Scheduler (PID: {old_pid}) did not exit, killing it")
+                self.force_kill(old_pid)
+                self.wait_for(lambda: not self.pid_exists(old_pid), timeout=5)
             
             # Start scheduler
             start_cmd = [sys.executable, 'start_scheduler.py', 'start']
             result = subprocess.run(start_cmd, cwd=self.project_dir, 
                                   capture_output=True, text=True, timeout=60)
             
-            if result.returncode == 0:
+            # Trust the new PID being alive over the start command's exit code
+            if result.returncode == 0 and self.wait_for(self.is_scheduler_running, timeout=10):
                 logging.info("Scheduler service restarted successfully")
                 self.last_restart_time = now
                 self.restart_count += 1
@@ -143,6 +202,28 @@ class SchedulerHealthMonitor:
             logging.error(f"Error restarting scheduler: {e}")
             return False
     
+    @staticmethod
+    def wait_for(condition, timeout, interval=0.1):
+        """Poll condition() until it is truthy or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if condition():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+    
+    @staticmethod
+    def force_kill(pid):
+        """Kill a process that ignored the normal stop request"""
+        try:
+            if os.name == 'nt':
+                subprocess.run(['taskkill', '/PID', str(pid), '/F'], capture_output=True, timeout=10)
+            else:
+                os.kill(pid, signal.SIGKILL)
+        except Exception as e:
+            logging.error(f"Error killing scheduler process {pid}: {e}")
+    
     def reset_restart_counter(self):
         """Reset restart counter after successful operation"""
         if self.restart_count > 0:
@@ -27,6 +27,15 @@ logging.basicConfig(
     ]
 )
 
+# Keep IN (...) lists below SQLite's default bound-parameter limit
+SQLITE_MAX_PARAMS = 500
+
+# Large write buffer so the export hits the disk in a few big writes
+CSV_WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Rows fetched from the cursor per round when streaming the export
+EXPORT_BATCH_SIZE = 1000
+
 class SchedulerService:
     """Independent scheduler service that runs in its own process"""
     
@@ -80,17 +89,12 @@ class SchedulerService:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            # Try to load from database
-            for key in self.jobs_config.keys():
-                try:
-                    cursor.execute("SELECT value FROM app_settings WHERE key = ?", (key,))
-                    result = cursor.fetchone()
-                    if result:
-                        self.jobs_config[key] = result[0]
-                except Exception as e:
-                    logging.debug(f"Could not load setting {key}: {e}")
-                    # Keep default value
-                    pass
+            # Load every known setting in one query; missing keys keep their defaults
+            keys = list(self.jobs_config.keys())
+            placeholders = ','.join('?' * len(keys))
+            cursor.execute(f"SELECT key, value FROM app_settings WHERE key IN ({placeholders})", keys)
+            for key, value in cursor.fetchall():
+                self.jobs_config[key] = value
             
             conn.close()
             logging.info(f"Loaded job settings: {self.jobs_config}")
@@ -139,7 +143,7 @@ class SchedulerService:
     
     def export_attendance_csv_job(self):
         """Export attendance logs to CSV"""
-        import pandas as pd
+        import csv
         import sqlite3
         import json
         
@@ -164,44 +168,38 @@ class SchedulerService:
             # Ensure directory exists
             os.makedirs(os.path.dirname(csv_path), exist_ok=True)
             
-            # Query unexported logs
+            # Stream unexported logs in batches so memory stays bounded by the batch size
             cursor.execute("""
-                SELECT user_id, device_id, timestamp, status, area 
+                SELECT id, user_id, device_id, timestamp, status, area 
                 FROM attendance_logs 
                 WHERE exported_flag = 0 
-                LIMIT 1000
+                ORDER BY timestamp, id
             """)
-            logs = cursor.fetchall()
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
             
             exported_count = 0
-            all_data = []
-            
-            for log in logs:
-                all_data.append({
-                    'User ID': log[0],
-                    'Device ID': log[1],
-                    'Timestamp': log[2],
-                    'Status': log[3],
-                    'Area': log[4]
-                })
-                exported_count += 1
-            
-            if all_data:
-                df = pd.DataFrame(all_data)
-                df.to_csv(csv_path, index=False)
+            exported_ids = []
+            
+            if batch:
+                # Write rows straight from the cursor tuples, no DataFrame needed
+                with open(csv_path, 'w', newline='', buffering=CSV_WRITE_BUFFER_SIZE) as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['User ID', 'Device ID', 'Timestamp', 'Status', 'Area'])
+                    while batch:
+                        exported_ids.extend(log[0] for log in batch)
+                        writer.writerows(log[1:] for log in batch)
+                        batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                exported_count = len(exported_ids)
                 logging.info(f"Exported {exported_count} records to {csv_path}")
                 
-                # Mark as exported
-                cursor.execute("""
-                    UPDATE attendance_logs 
-                    SET exported_flag = 1 
-                    WHERE exported_flag = 0 
-                    AND id IN (
-                        SELECT id FROM attendance_logs 
-                        WHERE exported_flag = 0 
-                        LIMIT 1000
+                # Mark exactly the rows written above, one UPDATE per chunk of ids
+                for i in range(0, len(exported_ids), SQLITE_MAX_PARAMS):
+                    chunk = exported_ids[i:i + SQLITE_MAX_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(
+                        f"UPDATE attendance_logs SET exported_flag = 1 WHERE id IN ({placeholders})",
+                        chunk
                     )
-                """)
             
             # Update job execution
             cursor.execute("""
@@ -260,50 +258,62 @@ class SchedulerService:
             
             if os.path.exists(csv_path):
                 # Read CSV with header to properly map columns
-                df = pd.read_csv(csv_path, on_bad_lines='skip')
+                # Read every column as text so ids keep their exact form and no per-cell str() is needed
+                df = pd.read_csv(csv_path, on_bad_lines='skip', dtype=str).fillna('')
+                column_count = len(df.columns)
                 logging.info(f"Processing {len(df)} rows from {csv_path}")
                 
-                for _, row in df.iterrows():
+                # Load existing user ids once instead of one SELECT per CSV row
+                cursor.execute("SELECT user_id FROM users")
+                existing_user_ids = {row[0] for row in cursor.fetchall()}
+                insert_rows = []
+                update_rows = []
+                
+                for row in df.itertuples(index=False, name=None):
                     try:
                         # Map columns based on CSV structure: EmployeeID is column 1
-                        user_id = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else None
+                        user_id = row[1].strip() if column_count > 1 else None
                         
                         if not user_id or user_id == 'nan' or user_id == 'EmployeeID':
                             continue
                         
-                        first_name = str(row.iloc[2]).strip() if len(row) > 2 and pd.notna(row.iloc[2]) else ''
-                        last_name = str(row.iloc[3]).strip() if len(row) > 3 and pd.notna(row.iloc[3]) else ''
-                        job_description = str(row.iloc[13]).strip() if len(row) > 13 and pd.notna(row.iloc[13]) else ''
-                        status = str(row.iloc[27]).strip() if len(row) > 27 and pd.notna(row.iloc[27]) else 'Active'
-                        site = str(row.iloc[10]).strip() if len(row) > 10 and pd.notna(row.iloc[10]) else ''
-                        
-                        # Check if user exists
-                        cursor.execute("SELECT id FROM users WHERE user_id = ?", (user_id,))
-                        existing_user = cursor.fetchone()
+                        first_name = row[2].strip() if column_count > 2 else ''
+                        last_name = row[3].strip() if column_count > 3 else ''
+                        job_description = row[13].strip() if column_count > 13 else ''
+                        status = (row[27].strip() if column_count > 27 else '') or 'Active'
+                        site = row[10].strip() if column_count > 10 else ''
                         
-                        if existing_user:
-                            cursor.execute("""
-                                UPDATE users SET 
-                                first_name = COALESCE(NULLIF(?, ''), first_name),
-                                last_name = COALESCE(NULLIF(?, ''), last_name),
-                                job_description = COALESCE(NULLIF(?, ''), job_description),
-                                status = ?,
-                                site = COALESCE(NULLIF(?, ''), site)
-                                WHERE user_id = ?
-                            """, (first_name, last_name, job_description, status, site, user_id))
-                            updated_count += 1
+                        if user_id in existing_user_ids:
+                            update_rows.append((first_name, last_name, job_description, status, site, user_id))
                         else:
-                            cursor.execute("""
-                                INSERT INTO users (user_id, first_name, last_name, job_description, status, site)
-                                VALUES (?, ?, ?, ?, ?, ?)
-                            """, (user_id, first_name or f'User{user_id}', last_name, job_description, status, site))
-                            imported_count += 1
+                            insert_rows.append((user_id, first_name or f'User{user_id}', last_name, job_description, status, site))
+                            # Repeated ids later in the file update the row inserted here
+                            existing_user_ids.add(user_id)
                             
                     except Exception as e:
                         logging.error(f"Error processing employee row: {e}")
                         continue
                 
+                cursor.executemany("""
+                    INSERT INTO users (user_id, first_name, last_name, job_description, status, site)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, insert_rows)
+                cursor.executemany("""
+                    UPDATE users SET 
+                    first_name = COALESCE(NULLIF(?, ''), first_name),
+                    last_name = COALESCE(NULLIF(?, ''), last_name),
+                    job_description = COALESCE(NULLIF(?, ''), job_description),
+                    status = ?,
+                    site = COALESCE(NULLIF(?, ''), site)
+                    WHERE user_id = ?
+                """, update_rows)
+                imported_count = len(insert_rows)
+                updated_count = len(update_rows)
+                
                 conn.commit()
+                # The import can change user statuses
+                from cache_manager import invalidate_terminated_users_cache
+                invalidate_terminated_users_cache()
                 logging.info(f"Employee import: {imported_count} new, {updated_count} updated")
             
             # Update job execution
@@ -365,32 +375,36 @@ class SchedulerService:
             terminated_count = 0
             
             if os.path.exists(csv_path):
-                # Read CSV with header to properly map columns
-                df = pd.read_csv(csv_path, on_bad_lines='skip')
-                logging.info(f"Processing {len(df)} rows from termination CSV")
+                # EmployeeID is in column 1, check EmploymentStatus in column 27;
+                # parse only those two columns rather than the whole file
+                column_count = len(pd.read_csv(csv_path, nrows=0).columns)
+                terminated_ids = set()
                 
-                for _, row in df.iterrows():
-                    try:
-                        # EmployeeID is in column 1, check EmploymentStatus in column 27
-                        user_id = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else None
-                        employment_status = str(row.iloc[27]).strip() if len(row) > 27 and pd.notna(row.iloc[27]) else ''
-                        
-                        if not user_id or user_id == 'EmployeeID1' or employment_status != 'Terminated':
-                            continue
-                            
-                        cursor.execute("""
-                            UPDATE users SET status = 'Terminated' 
-                            WHERE user_id = ? AND status != 'Terminated'
-                        """, (user_id,))
-                        
-                        if cursor.rowcount > 0:
-                            terminated_count += 1
-                            
-                    except Exception as e:
-                        logging.error(f"Error processing termination: {e}")
-                        continue
+                if column_count > 27:
+                    df = pd.read_csv(csv_path, on_bad_lines='skip', dtype=str, usecols=[1, 27]).fillna('')
+                    logging.info(f"Processing {len(df)} rows from termination CSV")
+                    
+                    user_ids = df.iloc[:, 0].str.strip()
+                    statuses = df.iloc[:, 1].str.strip()
+                    terminated_ids = set(user_ids[statuses == 'Terminated']) - {'', 'EmployeeID1'}
+                else:
+                    logging.warning(f"Termination CSV {csv_path} has no EmploymentStatus column")
+                
+                # One UPDATE per chunk of ids instead of one per CSV row
+                terminated_ids = list(terminated_ids)
+                for i in range(0, len(terminated_ids), SQLITE_MAX_PARAMS):
+                    chunk = terminated_ids[i:i + SQLITE_MAX_PARAMS]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f"""
+                        UPDATE users SET status = 'Terminated' 
+                        WHERE user_id IN ({placeholders}) AND status != 'Terminated'
+                    """, chunk)
+                    terminated_count += cursor.rowcount
                 
                 conn.commit()
+                if terminated_count:
+                    from cache_manager import invalidate_terminated_users_cache
+                    invalidate_terminated_users_cache()
             
             # Update job execution
             cursor.execute("""
@@ -469,6 +483,8 @@ class SchedulerService:
                 except Exception as e:
                     logging.warning(f"Failed to collect logs from device {ip_address}: {e}")
             
+            device_manager.close_all()
+            
             # Update job execution
             cursor.execute("""
                 UPDATE job_executions 
@@ -528,6 +544,7 @@ class SchedulerService:
         try:
             device_manager = DeviceManager()
             result = device_manager.balance_devices_in_area()
+            device_manager.close_all()
             
             # Update job execution
             cursor.execute("""
@@ -642,6 +659,8 @@ class SchedulerService:
                     logging.error(f"Error syncing device {device[0] if device else 'unknown'}: {e}")
                     continue
             
+            device_mgr.close_all()
+            
             # Update job execution
             cursor.execute("""
                 UPDATE job_executions 
@@ -754,6 +773,8 @@ class SchedulerService:
             # Use Dubai timezone
             dubai_tz = timezone('Asia/Dubai')
             
+            # coalesce/max_instances stop a slow run from stacking overlapping copies;
+            # jobs that must not be silently skipped override misfire_grace_time below
             self.scheduler = BlockingScheduler(
                 timezone=dubai_tz,
                 job_defaults={
@@ -772,6 +793,7 @@ class SchedulerService:
                     trigger="interval",
                     minutes=csv_interval,
                     id='csv_export',
+                    misfire_grace_time=300,
                     replace_existing=True
                 )
                 logging.info(f"Scheduled CSV export every {csv_interval} minutes")
@@ -785,6 +807,7 @@ class SchedulerService:
                     hour=hour,
                     minute=minute,
                     id='employee_import',
+                    misfire_grace_time=3600,
                     replace_existing=True
                 )
                 logging.info(f"Scheduled employee import daily at {employee_sync_time}")
@@ -798,6 +821,7 @@ class SchedulerService:
                     hour=hour,
                     minute=minute,
                     id='employee_terminate',
+                    misfire_grace_time=3600,
                     replace_existing=True
                 )
                 logging.info(f"Scheduled employee termination daily at {terminate_sync_time}")
@@ -301,7 +301,7 @@ class OptimizedDeviceSync:
         templates_synced = 0
         
         existing_uids = {user.uid for user in target_summary['users'].values()}
-        max_uid = max(existing_uids) if existing_uids else 0
+        max_uid = max(existing_uids, default=0)
         
         for user_id, user in detailed_data['users'].items():
             try:
@@ -1,10 +1,21 @@
 from app import db
 from models import AppSetting
+from cache_manager import settings_cache
+
+# Settings change a few times a day at most; a short TTL keeps other processes in step
+SETTING_CACHE_TTL = 60
+
+# Cached marker for keys that have no row, so misses are cached too
+_MISSING = object()
 
 def get_setting(key, default_value=None):
     """Get application setting value"""
-    setting = AppSetting.query.get(key)
-    return setting.value if setting else default_value
+    value = settings_cache.get(key)
+    if value is None:
+        setting = AppSetting.query.get(key)
+        value = setting.value if setting else _MISSING
+        settings_cache.set(key, value, SETTING_CACHE_TTL)
+    return default_value if value is _MISSING else value
 
 def set_setting(key, value):
     """Set application setting value"""
@@ -16,3 +27,8 @@ def set_setting(key, value):
         db.session.add(setting)
     
     db.session.commit()
+    settings_cache.delete(key)
+
+def clear_setting_cache():
+    """Drop cached settings after writing AppSetting rows directly"""
+    settings_cache.clear()
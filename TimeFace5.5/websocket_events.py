@@ -32,14 +32,12 @@ def handle_device_status_request():
         devices = Device.query.all()
         device_status = []
         
+        # Probe all devices concurrently; failed probes come back offline
+        online_map = device_manager.check_devices_online(device.ip_address for device in devices)
+        
         for device in devices:
-            try:
-                online = device_manager.is_device_online(device.ip_address)
-                device.online_status = online
-            except Exception as e:
-                logging.warning(f"Could not check status for device {device.name}: {str(e)}")
-                online = False
-                device.online_status = False
+            online = online_map.get(device.ip_address, False)
+            device.online_status = online
             
             device_status.append({
                 'id': device.id,
@@ -65,8 +63,10 @@ def device_status_monitor():
                 device_status = []
                 status_changed = False
                 
+                online_map = device_manager.check_devices_online(device.ip_address for device in devices)
+                
                 for device in devices:
-                    online = device_manager.is_device_online(device.ip_address)
+                    online = online_map.get(device.ip_address, False)
                     if device.online_status != online:
                         device.online_status = online
                         status_changed = True
@@ -125,15 +125,16 @@ class WorkingSyncSolution:
         source_templates = source_data['fingerprint_templates']
         
         # Find users missing on target device
-        users_to_add = [user for user_id, user in source_users.items() 
-                       if user_id not in target_users]
+        # dict key views support set difference: one hash pass over each side
+        missing_user_ids = source_users.keys() - target_users.keys()
+        users_to_add = [source_users[user_id] for user_id in missing_user_ids]
         
         if users_to_add:
             logging.info(f"Adding {len(users_to_add)} users from {source_ip} to {target_ip}")
             
             # Get existing UIDs on target device to avoid conflicts
             existing_uids = {user.uid for user in target_users.values()}
-            max_uid = max(existing_uids) if existing_uids else 0
+            max_uid = max(existing_uids, default=0)
             
             for user in users_to_add:
                 try: